@@ -1,36 +1,58 @@
-from pocketflow import Flow
+from pocketflow import AsyncFlow
 # Import all node classes from nodes.py
 from nodes import (
     FetchRepo,
+    TutorialCache,
+    CondenseFiles,
     IdentifyAbstractions,
     AnalyzeRelationships,
-    OrderChapters,
+    IdentifyAndRelate,
     WriteChapters,
     CombineTutorial,
+    PrefetchIndex,
     WriteBeginnerFriendlyEpisode
 )
 
+# Built once per process: the flow copies each node when it runs it, so per-run state
+# never lands on these instances and only the shared store differs between runs
+_tutorial_flow = None
+
 def create_tutorial_flow():
-    """Creates and returns the codebase tutorial generation flow."""
+    """Returns the codebase tutorial generation flow, building it on first use."""
+    global _tutorial_flow
+    if _tutorial_flow is None:
+        _tutorial_flow = _build_tutorial_flow()
+    return _tutorial_flow
+
+def _build_tutorial_flow():
+    """Creates the codebase tutorial generation flow."""
 
     # Instantiate nodes
     fetch_repo = FetchRepo()
-    identify_abstractions = IdentifyAbstractions(max_retries=5, wait=20)
-    analyze_relationships = AnalyzeRelationships(max_retries=5, wait=20)
-    order_chapters = OrderChapters(max_retries=5, wait=20)
-    write_chapters = WriteChapters(max_retries=5, wait=20) # This is a BatchNode
-    write_beginner_friendly_episode = WriteBeginnerFriendlyEpisode(max_retries=3, wait=10)
+    tutorial_cache = TutorialCache()
+    condense_files = CondenseFiles()
+    identify_abstractions = IdentifyAbstractions(max_retries=5, wait=2)
+    analyze_relationships = AnalyzeRelationships(max_retries=5, wait=2)
+    identify_and_relate = IdentifyAndRelate(max_retries=5, wait=2)
+    write_chapters = WriteChapters(max_retries=5, wait=2, max_concurrency=4, batch_size=4) # This is an AsyncParallelBatchNode
+    write_beginner_friendly_episode = WriteBeginnerFriendlyEpisode(max_retries=3, wait=2)
+    prefetch_index = PrefetchIndex()
     combine_tutorial = CombineTutorial()
 
     # Connect nodes in sequence based on the design
-    fetch_repo >> identify_abstractions
+    fetch_repo >> tutorial_cache
+    tutorial_cache >> condense_files
+    tutorial_cache - "done" >> combine_tutorial # Cached tutorial for the same files
+    condense_files >> identify_abstractions
+    condense_files - "single_pass" >> identify_and_relate # Both analysis steps in one request
     identify_abstractions >> analyze_relationships
-    analyze_relationships >> order_chapters
-    order_chapters >> write_chapters
+    analyze_relationships >> prefetch_index # Also determines the chapter order
+    identify_and_relate >> prefetch_index
+    prefetch_index >> write_chapters # Index is generated in the background from here on
     write_chapters >> write_beginner_friendly_episode
     write_beginner_friendly_episode >> combine_tutorial
 
-    # Create the flow starting with FetchRepo
-    tutorial_flow = Flow(start=fetch_repo)
+    # Create the flow starting with FetchRepo (async so chapters can be written concurrently)
+    tutorial_flow = AsyncFlow(start=fetch_repo)
 
     return tutorial_flow
@@ -1,8 +1,14 @@
 import dotenv
 import os
+import asyncio
 import argparse
+try:
+    import uvloop  # Optional: faster event loop for the concurrent LLM calls
+except ImportError:
+    uvloop = None
 # Import the function that creates the flow
 from flow import create_tutorial_flow
+from utils.call_llm import cache_stats
 
 dotenv.load_dotenv()
 
@@ -56,6 +62,10 @@ def main():
     parser.add_argument("--no-cache", action="store_true", help="Disable LLM response caching (default: caching enabled)")
     # Add max_abstraction_num parameter to control the number of abstractions
     parser.add_argument("--max-abstractions", type=int, default=20, help="Maximum number of abstractions to identify (default: 20)")
+    # Send only signatures and docstrings of source files to the analysis prompts
+    parser.add_argument("--condense", action="store_true", help="Condense source files to signatures and docstrings when identifying abstractions and relationships (default: full files)")
+    # Identify abstractions and their relationships in one LLM request
+    parser.add_argument("--single-pass", action="store_true", help="Identify abstractions, relationships and chapter order in a single LLM request (default: separate requests)")
 
     args = parser.parse_args()
 
@@ -88,11 +98,24 @@ def main():
         # Add max_abstraction_num parameter
         "max_abstraction_num": args.max_abstractions,
 
+        # Add condense_files flag
+        "condense_files": args.condense,
+
+        # Add single_pass flag
+        "single_pass": args.single_pass,
+
+        # Character limits for the abstraction analysis context (None: LLM_CONTEXT_BUDGET in nodes.py)
+        "llm_context_budget": None,
+
         # Outputs will be populated by the nodes
         "files": [],
+        "repo_fingerprint": None, # Hash of the fetched paths and contents
+        "directory_tree": None, # Directory tree of "files" for prompts
+        "files_condensed": None, # Outlines of "files" for analysis prompts (--condense)
         "abstractions": [],
         "relationships": {},
         "chapter_order": [],
+        "chapter_filenames": None, # Chapter number/name/filename per abstraction index
         "chapters": [],
         "final_output_dir": None
     }
@@ -104,8 +127,15 @@ def main():
     # Create the flow instance
     tutorial_flow = create_tutorial_flow()
 
-    # Run the flow
-    tutorial_flow.run(shared)
+    # Run the flow (on uvloop when it is installed)
+    if uvloop is not None:
+        uvloop.run(tutorial_flow.run_async(shared))
+    else:
+        asyncio.run(tutorial_flow.run_async(shared))
+
+    if not args.no_cache:
+        stats = cache_stats()
+        print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
 
 if __name__ == "__main__":
     main()
@@ -1,10 +1,30 @@
 import os
 import re
+import asyncio
+import hashlib
+import json
+import random
+import time
 import yaml
-from pocketflow import Node, BatchNode
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pocketflow import Node, AsyncNode, AsyncParallelBatchNode
 from utils.crawl_git_repo import crawl_git_repo, parse_github_url
-from utils.call_llm import call_llm
+from utils.call_llm import call_llm, is_llm_failure
 from utils.crawl_local_files import crawl_local_files
+from utils.condense_files import condense_files
+from utils.tutorial_cache import (
+    tutorial_cache_key,
+    load_cached_tutorial,
+    save_cached_tutorial,
+)
+
+# libyaml's C parser when PyYAML was built with it, the pure-Python one otherwise
+try:
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
 
 # Shared prompt constants to reduce redundancy
 STRICT_ACCURACY_REQUIREMENTS = """
@@ -29,6 +49,167 @@ PROFESSIONAL_TONE_GUIDELINES = """
 - Organize content logically with clear headers and sections
 """
 
+# What IdentifyAbstractions should focus on for each repository type ("mixed" for any other)
+IDENTIFY_REPO_TYPE_GUIDANCE = {
+    'monorepo': 'Focus on distinct functional areas and services across multiple packages/modules.',
+    'library': 'Focus on public APIs, core algorithms, and main interfaces that users interact with.',
+    'application': 'Prioritize business logic components, data models, and user-facing features over infrastructure.',
+    'framework': 'Emphasize extensibility points, plugin systems, and core processing engines.',
+    'documentation': 'Focus on content organization, generation systems, and publishing workflows.',
+    'infrastructure': 'Focus on deployment configurations, infrastructure components, and automation systems.',
+    'mixed': 'Analyze the primary purpose first, then apply appropriate abstraction strategy.',
+}
+
+# What AnalyzeRelationships should focus on for each repository type ("mixed" for any other)
+ANALYZE_REPO_TYPE_GUIDANCE = {
+    'monorepo': 'Focus on relationships between distinct functional areas and services across multiple packages/modules.',
+    'library': 'Emphasize public API relationships, core algorithm interactions, and main interface connections.',
+    'application': 'Prioritize business logic relationships, data flow between models, and user-facing feature connections.',
+    'framework': 'Focus on extensibility relationships, plugin system connections, and core processing engine interactions.',
+    'documentation': 'Emphasize content organization relationships, generation system connections, and publishing workflow interactions.',
+    'infrastructure': 'Focus on deployment relationships, infrastructure component connections, and automation system interactions.',
+    'mixed': 'Analyze the primary relationships first, then apply appropriate connection strategy.',
+}
+
+# What the index page's Repository Structure section should cover for each repository
+# type ("mixed" for any other)
+INDEX_REPO_TYPE_GUIDANCE = {
+    'monorepo': '- Multiple distinct functional areas and how they are organized across packages/modules\n   - Key services or applications and their separation of concerns\n   - Shared libraries and common utilities',
+    'library': '- Public API structure and main entry points\n   - Core library organization and module hierarchy\n   - Distribution and packaging approach',
+    'application': '- Application entry points and main execution flow\n   - Business logic organization and feature structure\n   - Configuration and deployment setup',
+    'framework': '- Extensibility mechanisms and plugin architecture\n   - CLI interfaces and developer tools\n   - Core processing engines and framework components',
+    'documentation': '- Content organization and documentation structure\n   - Example code and tutorial progression\n   - Publishing and generation workflows',
+    'infrastructure': '- Infrastructure components and deployment configurations\n   - Automation systems and CI/CD pipelines\n   - Environment management and orchestration',
+    'mixed': '- Primary purpose and main organizational patterns\n   - Key functional areas and their relationships\n   - Overall architecture and design approach',
+}
+
+# Static system prompt for IdentifyAbstractions. It is identical for every run, so
+# providers can serve it from their prompt-prefix cache.
+IDENTIFY_ABSTRACTIONS_PREFIX = f"""
+## Role and Task
+You are an expert software architect and technical documentation specialist. Your task is to identify the top core code abstractions in a repository for comprehensive wiki documentation that serves as a definitive reference for developers. The maximum number of abstractions and the codebase are given in the request.
+
+## Critical Requirements
+{STRICT_ACCURACY_REQUIREMENTS}
+
+## Required Output Format
+Provide your analysis as a compact JSON array following this exact structure. `file_indices` lists the indices of the relevant files from the Available Files listing.
+
+```json
+[
+  {{"name": "Core Authentication System", "description": "Manages user authentication, session handling, and access control across the application. Serves as the central security gateway that validates user credentials and permissions.", "file_indices": [0, 2]}},
+  {{"name": "Data Processing Pipeline", "description": "Transforms raw input data through multiple validation and processing stages. Acts as the core data transformation engine that ensures data quality and format consistency.", "file_indices": [1, 4]}}
+]
+```"""
+
+# Static system prompt for AnalyzeRelationships (see IDENTIFY_ABSTRACTIONS_PREFIX)
+ANALYZE_RELATIONSHIPS_PREFIX = f"""
+## Role and Task
+You are an expert software architect and technical documentation specialist. Your task is to analyze code abstractions and their relationships to create a comprehensive project overview for wiki documentation.
+
+## Critical Requirements
+{STRICT_ACCURACY_REQUIREMENTS}
+
+**IMPORTANT**: Base your analysis ONLY on the actual code and abstractions provided. Do NOT:
+- Reference external frameworks, libraries, or tools not shown in the code
+- Create fictional documentation links, URLs, or external resources
+- Mention design patterns or concepts not clearly evident in the provided code
+- Assume relationships that aren't explicitly demonstrated in the code
+
+## Analysis Instructions
+1. **Create a concise project summary** that objectively describes what this codebase accomplishes, its primary purpose, and key capabilities
+2. **Map concrete relationships** between abstractions based on verifiable code interactions (imports, function calls, inheritance, data flow, configuration)
+3. **Prioritize significant relationships** - focus on connections that are architecturally important, not every minor interaction
+4. **Use neutral, encyclopedic tone** - precise technical language that remains accessible
+5. **Focus on architectural clarity** - provide a clear mental model of the system's structure
+6. **Maintain proportional emphasis** - give more attention to core system relationships, less to peripheral connections
+7. **Ensure complete coverage** - every abstraction should be connected to the overall system design
+
+## Required Output
+Provide a YAML response with three sections:
+
+### 1. Project Summary
+Write a concise overview explaining what this project does, its main purpose, and key functionality. Focus on essential information only. Use **bold** and *italic* markdown for emphasis.
+
+### 2. Relationships
+List relationships between abstractions based on actual code interactions. Each relationship must specify:
+- `from_abstraction`: Source abstraction index and name
+- `to_abstraction`: Target abstraction index and name  
+- `label`: Brief technical description of the relationship
+
+**Relationship Types to Look For**:
+- Function/method calls between abstractions
+- Data passing or transformation
+- Inheritance or composition
+- Configuration or initialization
+- Event handling or callbacks
+
+### 3. Chapter Order
+List every abstraction exactly once, in the order its wiki article should be presented. Each entry is the abstraction index followed by its name as a comment.
+
+**Ordering Principles**:
+- Start with abstractions that implement the project's main purpose and its entry points or user-facing interfaces
+- Follow with the core architecture and domain logic
+- Then data management, and finally supporting infrastructure such as configuration and utilities
+- Order by actual importance to the system, using only the relationships evident in the code
+
+## Output Format
+```yaml
+summary: |
+  This project implements a **web scraping framework** that processes data through multiple stages.
+  The system uses a *pipeline architecture* where data flows from collectors to processors to storage.
+relationships:
+  - from_abstraction: 0 # DataCollector
+    to_abstraction: 1 # DataProcessor
+    label: "Feeds raw data"
+  - from_abstraction: 1 # DataProcessor
+    to_abstraction: 2 # DataStorage
+    label: "Stores processed results"
+  - from_abstraction: 3 # ConfigManager
+    to_abstraction: 0 # DataCollector
+    label: "Provides settings"
+chapter_order:
+  - 0 # DataCollector
+  - 1 # DataProcessor
+  - 2 # DataStorage
+  - 3 # ConfigManager
+```
+
+**Remember**: Only describe relationships and functionality that are clearly evident in the provided code context."""
+
+# Static system prompt for IdentifyAndRelate, which does the work of both prompts above at once
+IDENTIFY_AND_RELATE_PREFIX = f"""
+## Role and Task
+You are an expert software architect and technical documentation specialist. In a single pass over a repository, identify its top core code abstractions for comprehensive wiki documentation, summarize the project, map the relationships between the abstractions and decide the order of their wiki articles. The maximum number of abstractions and the codebase are given in the request.
+
+## Critical Requirements
+{STRICT_ACCURACY_REQUIREMENTS}
+
+**IMPORTANT**: Base your analysis ONLY on the actual code provided. Do NOT:
+- Reference external frameworks, libraries, or tools not shown in the code
+- Create fictional documentation links, URLs, or external resources
+- Mention design patterns or concepts not clearly evident in the provided code
+- Assume relationships that aren't explicitly demonstrated in the code
+
+## Instructions
+1. **Abstractions**: Identify the core abstractions. Each has a `name`, a `description` of its purpose and role, and the `file_indices` of its relevant files from the Available Files listing
+2. **Summary**: Write a concise overview of what the project does, its main purpose and key functionality. Use **bold** and *italic* markdown for emphasis
+3. **Relationships**: Map significant relationships between abstractions based on verifiable code interactions (calls, data flow, inheritance, composition, configuration, callbacks). `from_abstraction` and `to_abstraction` are 0-based indices into your `abstractions` list, and `label` is a brief technical description
+4. **Chapter Order**: List every abstraction index exactly once. Start with the project's main purpose and entry points, follow with the core architecture and domain logic, then data management, and finally supporting infrastructure
+5. Ensure every abstraction is connected to the overall system design, and use a neutral, encyclopedic tone
+
+## Required Output Format
+Provide a single compact JSON object following this exact structure:
+
+```json
+{{"abstractions": [{{"name": "Data Collector", "description": "Gathers raw records from the configured sources.", "file_indices": [0, 2]}}, {{"name": "Data Processor", "description": "Validates and transforms collected records.", "file_indices": [1]}}], "summary": "This project implements a **data pipeline** that collects and processes records.", "relationships": [{{"from_abstraction": 0, "to_abstraction": 1, "label": "Feeds raw data"}}], "chapter_order": [0, 1]}}
+```
+
+**Remember**: Only describe abstractions, relationships and functionality that are clearly evident in the provided code context."""
+
+# Runs LLM calls that can start before the node that needs their result
+BACKGROUND_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
 OUTPUT_FORMAT_INSTRUCTIONS = """
 ## Output Format
 - Provide your response in valid Markdown format
@@ -37,22 +218,227 @@ OUTPUT_FORMAT_INSTRUCTIONS = """
 - Ensure all content is well-structured and readable
 """
 
+# Static system prompt for WriteChapters; the project, wiki structure and article details go in the request
+WRITE_CHAPTER_PREFIX = f"""
+## Role and Task
+You are an expert software architect and technical documentation specialist. Your task is to write a comprehensive wiki article about one component of a codebase repository. The project, the wiki structure and the component (the **Article Subject**) are given in the request.
+
+## Critical Requirements
+{STRICT_ACCURACY_REQUIREMENTS}
+
+**IMPORTANT**: Base your article content ONLY on the actual code and context provided. Do NOT:
+- Reference external libraries, frameworks, or tools not shown in the provided code
+- Create fictional URLs, documentation links, or external resources
+- Mention design patterns or concepts not clearly evident in the code
+- Add code examples that don't exist in the provided context
+- Reference files, functions, or classes not present in the code snippets
+- Create hypothetical scenarios or use cases not supported by the actual code
+- Repeat detailed explanations already covered in other wiki articles
+- Over-explain concepts that are peripheral to this component's core functionality
+
+**IMPORTANT**: Focus on:
+- Architectural purpose and design rationale
+- How this component solves specific problems in the system
+- Avoid repeating explanations from other articles
+
+{PROFESSIONAL_TONE_GUIDELINES}
+
+## Wiki Article Structure Requirements
+Your article must include:
+
+1. **Article Title**: `# ` followed by the exact Article Subject
+2. **Overview**: 
+   - Concise explanation of the component's purpose
+   - Why this component exists and what problem it solves
+
+3. **Architecture**: 
+   - Design decisions and architectural patterns used
+   - Brief description of the component's design and structure
+
+4. **Role in System**: 
+   - How this component fits into the overall system design
+   - Primary usage scenarios within the system
+
+5. **Key Components**:
+   - Essential classes, functions, and methods
+   - Primary functions and responsibilities
+
+6. **Relationships and Interactions**:
+   - Direct connections to other components
+   - How it connects to and collaborates with other components
+
+7. **Design Rationale**:
+   - Why it was designed this way
+   - Critical implementation specifics
+
+8. **Implementation Technical Details**: 
+   - Focused walkthrough of key code elements
+   - Critical implementation specifics only
+
+9. **See Also**: 
+   - References to related wiki articles (if applicable)
+
+
+**Content Guidelines**:
+- Keep each section focused and proportional to the component's actual importance
+- Focus on what makes this component architecturally significant, not general programming concepts
+
+## Code Presentation Rules (if applicable)
+- Keep code blocks under 20 lines
+- Only show code that exists in the provided context
+- Add minimal comments only when they clarify complex logic
+- Break long code into logical segments with explanations
+- Use proper syntax highlighting
+
+## Output Format
+Provide ONLY the Markdown content (no code fences around the entire output).
+**Remember**: Every code example, function reference, and technical detail must be based on the actual code provided in the request."""
+
+# Static system prompt for WriteBeginnerFriendlyEpisode; the wiki content goes in the request
+BEGINNER_EPISODE_PREFIX = f"""
+## Role and Task
+You are an expert technical writer and educator. Your task is to transform a detailed technical wiki about a software project, given as summaries of its articles, into a beginner-friendly overview document. This document should be easy for a non-technical person to understand while still conveying accurate information about the system and its concepts.
+
+## Critical Requirements
+{STRICT_ACCURACY_REQUIREMENTS}
+
+The document should prioritize clarity, relevance, and accessibility. The primary goal is to describe what the project does, relationships between modules and parts of the codebase, presenting complex technical concepts and terms in a way that an average non-technical person can understand. The document should be beginner-friendly, precise, and approachable, without oversimplifying the underlying concepts.
+
+## Suggested Document Structure (Adapt as needed)
+Note: This structure is purely suggestive and should not be followed rigidly. Combine sections or adapt as necessary to best explain *this specific project*.
+
+1.  **Introduction**
+    *   Project overview
+    *   Core purpose
+    *   System's primary objectives
+
+2.  **System Architecture**
+    *   High-level system diagram (conceptual, using mermaid)
+    *   Key components
+    *   Component interactions
+
+3.  **Module Breakdown**
+    *   Core modules
+    *   Module responsibilities
+    *   Functional interactions
+
+4.  **Key Concepts**
+    *   Fundamental technical concepts
+    *   Simplified explanations
+    *   Conceptual relationships
+
+5.  **Workflow and Data Flow**
+    *   System operation process
+    *   Data transformation steps
+    *   Key processing logic
+
+6.  **Technical Foundations**
+    *   Primary design principles
+    *   Critical implementation strategies
+    *   Core algorithmic approaches
+
+7.  **Glossary**
+    *   Essential technical terms
+    *   Plain language definitions
+
+{OUTPUT_FORMAT_INSTRUCTIONS}
+- Make technical explanations **accessible to a non-technical audience**.
+- Use analogies, and examples to explain complex concepts if necessary
+- Avoid jargon where possible, or explain it clearly.
+- Focus on the "what" and "why" from a user perspective.
+- Be concise
+- Don't overuse lists, prefer paragraphs
+
+Provide ONLY the Markdown content for the episode (no code fences around the entire output).
+"""
+
+
+# Static system prompt for distilling one wiki article before WriteBeginnerFriendlyEpisode
+CHAPTER_DISTILL_PREFIX = """
+## Role and Task
+You are an expert technical writer. Distill the wiki article given in the request into a summary of at most 150 words.
+
+## Requirements
+- Preserve every architectural claim: the component's purpose, its key parts and how it interacts with other components
+- Use only information stated in the article; do not add anything
+- Keep the names of components, classes and functions exactly as written
+- Write the summary in the same language as the article
+
+Provide ONLY the summary text."""
+
+# Articles distilled concurrently for WriteBeginnerFriendlyEpisode
+CHAPTER_DISTILL_WORKERS = 4
+
+
+# Bump when the layout produced by IdentifyAbstractions' create_llm_context changes
+LLM_CONTEXT_VERSION = 2
+# Last built LLM context keyed by (repo fingerprint, LLM_CONTEXT_VERSION, condensed, budget).
+# Contexts run to megabytes, so only the most recent one is kept
+_llm_context_memo = {}
+
+# Size limits, in characters, for the codebase context of IdentifyAbstractions; overridden
+# per run by shared["llm_context_budget"]. Files beyond max_file_chars are truncated, and
+# code files stop being added once max_total_chars is reached (documentation always goes in)
+LLM_CONTEXT_BUDGET = {"max_file_chars": 30000, "max_total_chars": 400000}
+
+# License files without "license" in their name
+LICENSE_FILENAMES = frozenset(("copying", "copyright"))
+
+# Documentation-like filenames: listed first in the IdentifyAbstractions context and
+# included with the index page's project context.
+# "doc" but not "docker": Dockerfiles and compose files are configuration, not docs
+CONTEXTUAL_FILE_PATTERN = re.compile(r"readme|doc(?!ker)|guide|overview|architecture")
+
+# Delimiter line between articles in a multi-chapter WriteChapters response
+CHAPTER_DELIMITER_PATTERN = re.compile(r"^\s*<<<CHAPTER (\d+)>>>\s*$", re.MULTILINE)
+
+# Characters replaced by "_" in chapter filenames: exactly those that are not
+# str.isalnum(), as "_" itself maps to "_"
+FILENAME_UNSAFE_CHAR_PATTERN = re.compile(r"\W")
+
+# Opening ("```" or "```markdown") and closing code fence around a whole LLM response
+CODE_FENCE_PATTERN = re.compile(r"\A\s*```(?:markdown)?\s*\n?|\n?```\s*\Z")
+
+# How many preceding chapters are summarized in each WriteChapters prompt
+PREVIOUS_CHAPTERS_WINDOW = 5
+
+
+# Fingerprint of the fetched files: changes whenever a path or any file content changes
+def compute_repo_fingerprint(files_data):
+    digest = hashlib.sha256()
+    for path, content in sorted(files_data):
+        digest.update(path.encode("utf-8"))
+        digest.update(hashlib.sha1(content.encode("utf-8")).digest())
+    return digest.hexdigest()
 
-# Helper to get content for specific file indices
+
+# Files whose content CombineTutorial feeds to the index page (README, license, docs)
+def is_project_context_file(path):
+    filename = path.rpartition('/')[2].lower()
+    return (
+        'license' in filename
+        or filename in LICENSE_FILENAMES
+        or CONTEXTUAL_FILE_PATTERN.search(filename) is not None  # Also matches README files
+    )
+
+
+# Helper to get content for specific file indices, labelled for the prompt
 def get_content_for_indices(files_data, indices):
     content_map = {}
     for i in indices:
         if 0 <= i < len(files_data):
             path, content = files_data[i]
-            content_map[f"{i} # {path}"] = (
-                content  # Use index + path as key for context
+            content_map[f"--- File: {path} ---"] = (
+                content  # Use the prompt label as key, so it is built once per file
             )
     return content_map
 
 
 # Helper function to check if language is non-English and get language hints
+@lru_cache(maxsize=None)
 def get_language_context(language):
-    """Returns language context information for prompt generation."""
+    """Returns language context information for prompt generation.
+    Built once per language; callers must not modify the returned dict."""
     is_non_english = language.lower() != "english"
     lang_cap = language.capitalize() if is_non_english else ""
     
@@ -76,6 +462,30 @@ def get_common_context(shared):
     }
 
 
+# Chapter numbers, names and filenames, built once per run from the chapter order
+def get_chapter_filenames(shared):
+    """
+    Returns {abstraction index: {"num", "name", "filename"}} for every valid entry of
+    shared["chapter_order"]. Abstractions and chapter order do not change once they are
+    determined, so the mapping is stored in shared["chapter_filenames"] on first use.
+    """
+    if shared.get("chapter_filenames") is None:
+        abstractions = shared["abstractions"]
+        chapter_filenames = {}
+        for i, abstraction_index in enumerate(shared["chapter_order"]):
+            if 0 <= abstraction_index < len(abstractions):
+                chapter_name = abstractions[abstraction_index]["name"]  # Potentially translated name
+                # Create safe filename (from potentially translated name)
+                safe_name = FILENAME_UNSAFE_CHAR_PATTERN.sub("_", chapter_name).lower()
+                chapter_filenames[abstraction_index] = {
+                    "num": i + 1,
+                    "name": chapter_name,
+                    "filename": f"{i+1:02d}_{safe_name}.md",
+                }
+        shared["chapter_filenames"] = chapter_filenames
+    return shared["chapter_filenames"]
+
+
 # Shared utility function to create directory tree representation
 def create_directory_tree(files_data, max_items_per_level=15, max_total_lines=40, max_depth=3):
     """Create a directory tree representation from files data.
@@ -95,50 +505,51 @@ def create_directory_tree(files_data, max_items_per_level=15, max_total_lines=40
     else:
         paths = [file_info[0] for file_info in files_data if isinstance(file_info, tuple) and len(file_info) >= 2]
     
-    # Build directory structure
+    # Build directory structure, only as deep as it is displayed
     tree_dict = {}
     for path in paths:
         parts = path.split('/')
+        directories, filename = parts[:-1], parts[-1]
+        if len(parts) > max_depth:
+            # Nothing below max_depth is shown, the directory at that level just has to exist
+            directories, filename = parts[:max_depth], None
         current = tree_dict
-        for part in parts[:-1]:  # directories
-            if part not in current:
-                current[part] = {}
-            current = current[part]
-        # Add file
-        if parts:
-            filename = parts[-1]
-            if isinstance(current, dict):
-                current[filename] = None  # None indicates it's a file
+        for part in directories:
+            current = current.setdefault(part, {})
+        if filename is not None:
+            current[filename] = None  # None indicates it's a file
     
-    # Convert to readable tree format
+    # Convert to readable tree format, stopping once max_total_lines are written
+    tree_lines = []
+
     def format_tree(tree_dict, prefix="", current_depth=0):
         if current_depth >= max_depth:
-            return []
+            return
         
-        lines = []
-        items = sorted(tree_dict.items()) if isinstance(tree_dict, dict) else []
+        names = sorted(tree_dict)
         
-        for i, (name, subtree) in enumerate(items[:max_items_per_level]):
-            is_last = i == len(items) - 1
+        for i, name in enumerate(names[:max_items_per_level]):
+            if len(tree_lines) >= max_total_lines:
+                return
+            is_last = i == len(names) - 1
             current_prefix = "└── " if is_last else "├── "
-            lines.append(f"{prefix}{current_prefix}{name}")
+            tree_lines.append(f"{prefix}{current_prefix}{name}")
             
-            if subtree is not None and isinstance(subtree, dict) and subtree:
+            subtree = tree_dict[name]
+            if subtree:
                 next_prefix = prefix + ("    " if is_last else "│   ")
-                lines.extend(format_tree(subtree, next_prefix, current_depth + 1))
-        
-        if len(items) > max_items_per_level:
-            lines.append(f"{prefix}... ({len(items) - max_items_per_level} more items)")
+                format_tree(subtree, next_prefix, current_depth + 1)
         
-        return lines
+        if len(names) > max_items_per_level and len(tree_lines) < max_total_lines:
+            tree_lines.append(f"{prefix}... ({len(names) - max_items_per_level} more items)")
     
-    tree_lines = format_tree(tree_dict)
-    return "\n".join(tree_lines[:max_total_lines])
+    format_tree(tree_dict)
+    return "\n".join(tree_lines)
 
 
 # Helper function to parse YAML from LLM responses with multiple strategies
 def parse_yaml_from_llm_response(response):
-    """Parse YAML from LLM response using multiple fallback strategies.
+    """Parse YAML (or JSON) from LLM response using multiple fallback strategies.
     
     Args:
         response (str): The LLM response text
@@ -151,8 +562,13 @@ def parse_yaml_from_llm_response(response):
     """
     yaml_str = None
     
-    # Strategy 1: Look for ```yaml code blocks
-    if "```yaml" in response:
+    # Strategy 1: Look for ```yaml or ```json code blocks
+    if "```json" in response:
+        try:
+            yaml_str = response.strip().split("```json")[1].split("```")[0].strip()
+        except IndexError:
+            pass
+    elif "```yaml" in response:
         try:
             yaml_str = response.strip().split("```yaml")[1].split("```")[0].strip()
         except IndexError:
@@ -166,7 +582,7 @@ def parse_yaml_from_llm_response(response):
             if len(parts) >= 3:
                 yaml_str = parts[1].strip()
                 # Remove language specifier if present (e.g., "yaml\n")
-                if yaml_str.startswith(('yaml\n', 'yml\n')):
+                if yaml_str.startswith(('yaml\n', 'yml\n', 'json\n')):
                     yaml_str = yaml_str.split('\n', 1)[1]
         except (IndexError, AttributeError):
             pass
@@ -175,22 +591,233 @@ def parse_yaml_from_llm_response(response):
     if yaml_str is None:
         yaml_str = response.strip()
     
+    # JSON is a subset of YAML, but json.loads is much faster than a YAML parser
+    if yaml_str.startswith(("[", "{")):
+        try:
+            return json.loads(yaml_str)
+        except json.JSONDecodeError:
+            pass  # e.g. YAML flow style; let the YAML parser handle it
+    
     # Parse YAML with error handling
     try:
-        return yaml.safe_load(yaml_str)
+        return yaml.load(yaml_str, Loader=YamlSafeLoader)
     except yaml.YAMLError as e:
         raise ValueError(f"Failed to parse YAML from LLM response. YAML Error: {e}\n\nResponse content:\n{response[:500]}...")
 
 
-# Simple LLM-based repository type detection using directory tree
-def detect_repository_type(files_data, shared_context=None):
-    """Detect repository type using LLM analysis of directory tree structure"""
-    # Check if we already have the result cached in shared context
-    if shared_context and "repository_type" in shared_context:
-        return shared_context["repository_type"]
-    # Create directory tree using shared utility
-    directory_tree = create_directory_tree(files_data, max_items_per_level=15, max_total_lines=40)
-    doc_context = extract_documentation_context(files_data)
+# Shared validators for the structured (YAML) LLM outputs. Each returns the cleaned-up
+# data or raises ValueError, which makes the calling node retry.
+
+# Parse an index reference such as 3, "3" or "3 # path/or/name"
+def parse_index_reference(entry):
+    if isinstance(entry, int):
+        return entry
+    return int(str(entry).split("#")[0].strip())
+
+
+# Validate identified abstractions and return [{"name", "description", "files"}]
+def validate_abstractions(abstractions, file_count):
+    if not isinstance(abstractions, list):
+        raise ValueError("LLM Output is not a list")
+
+    validated_abstractions = []
+    for item in abstractions:
+        if not isinstance(item, dict) or not all(
+            k in item for k in ["name", "description", "file_indices"]
+        ):
+            raise ValueError(f"Missing keys in abstraction item: {item}")
+        if not isinstance(item["name"], str):
+            raise ValueError(f"Name is not a string in item: {item}")
+        if not isinstance(item["description"], str):
+            raise ValueError(f"Description is not a string in item: {item}")
+        if not isinstance(item["file_indices"], list):
+            raise ValueError(f"file_indices is not a list in item: {item}")
+
+        # Validate indices
+        validated_indices = []
+        for idx_entry in item["file_indices"]:
+            try:
+                idx = parse_index_reference(idx_entry)
+                if not (0 <= idx < file_count):
+                    raise ValueError(
+                        f"Invalid file index {idx} found in item {item['name']}. Max index is {file_count - 1}."
+                    )
+                validated_indices.append(idx)
+            except (ValueError, TypeError):
+                raise ValueError(
+                    f"Could not parse index from entry: {idx_entry} in item {item['name']}"
+                )
+
+        # Store only the required fields
+        validated_abstractions.append(
+            {
+                "name": item["name"],  # Potentially translated name
+                "description": item["description"],  # Potentially translated description
+                "files": sorted(set(validated_indices)),
+            }
+        )
+    return validated_abstractions
+
+
+# Validate relationships and return [{"from": int, "to": int, "label": str}]
+def validate_relationships(relationships, num_abstractions):
+    if not isinstance(relationships, list):
+        raise ValueError("relationships is not a list")
+
+    validated_relationships = []
+    for rel in relationships:
+        # Check for 'label' key
+        if not isinstance(rel, dict) or not all(
+            k in rel for k in ["from_abstraction", "to_abstraction", "label"]
+        ):
+            raise ValueError(
+                f"Missing keys (expected from_abstraction, to_abstraction, label) in relationship item: {rel}"
+            )
+        # Validate 'label' is a string
+        if not isinstance(rel["label"], str):
+            raise ValueError(f"Relationship label is not a string: {rel}")
+
+        # Validate indices
+        try:
+            from_idx = parse_index_reference(rel["from_abstraction"])
+            to_idx = parse_index_reference(rel["to_abstraction"])
+            if not (
+                0 <= from_idx < num_abstractions and 0 <= to_idx < num_abstractions
+            ):
+                raise ValueError(
+                    f"Invalid index in relationship: from={from_idx}, to={to_idx}. Max index is {num_abstractions-1}."
+                )
+            validated_relationships.append(
+                {
+                    "from": from_idx,
+                    "to": to_idx,
+                    "label": rel["label"],  # Potentially translated label
+                }
+            )
+        except (ValueError, TypeError):
+            raise ValueError(f"Could not parse indices from relationship: {rel}")
+    return validated_relationships
+
+
+# Validate an LLM-produced chapter order and return it as a list of abstraction indices
+def validate_chapter_order(ordered_indices_raw, num_abstractions):
+    if not isinstance(ordered_indices_raw, list):
+        raise ValueError("Chapter order is not a list")
+
+    ordered_indices = []
+    seen_indices = set()
+    for entry in ordered_indices_raw:
+        try:
+            idx = parse_index_reference(entry)
+            if not (0 <= idx < num_abstractions):
+                raise ValueError(
+                    f"Invalid index {idx} in ordered list. Max index is {num_abstractions-1}."
+                )
+            if idx in seen_indices:
+                raise ValueError(f"Duplicate index {idx} found in ordered list.")
+            ordered_indices.append(idx)
+            seen_indices.add(idx)
+
+        except (ValueError, TypeError):
+            raise ValueError(
+                f"Could not parse index from ordered list entry: {entry}"
+            )
+
+    # Check if all abstractions are included
+    if len(ordered_indices) != num_abstractions:
+        raise ValueError(
+            f"Ordered list length ({len(ordered_indices)}) does not match number of abstractions ({num_abstractions}). Missing indices: {set(range(num_abstractions)) - seen_indices}"
+        )
+    return ordered_indices
+
+
+# Simple LLM-based repository type detection using directory tree
+def detect_repository_type(files_data, shared_context=None):
+    """Detect repository type using LLM analysis of directory tree structure"""
+    # Check if we already have the result cached in shared context
+    if shared_context and "repository_type" in shared_context:
+        return shared_context["repository_type"]
+    # Use the detection FetchRepo started in the background, if any
+    future = shared_context.pop("repository_type_future", None) if shared_context else None
+    if future is not None:
+        repo_type = future.result()
+    else:
+        repo_type = _request_repository_type(
+            files_data,
+            get_documentation_context(shared_context) if shared_context else None,
+            use_cache=shared_context.get("use_cache", True) if shared_context else True,
+            directory_tree=shared_context.get("directory_tree") if shared_context else None,
+        )
+
+    if shared_context is not None:
+        shared_context["repository_type"] = repo_type
+        print(f"Repository type detected: {repo_type}")
+    return repo_type
+
+
+# Layout signals used by guess_repository_type
+PACKAGE_MANIFESTS = ('package.json', 'pyproject.toml', 'setup.py', 'cargo.toml', 'go.mod', 'pom.xml')
+MONOREPO_DIRS = ('packages', 'apps', 'services', 'libs', 'crates', 'modules')
+PYTHON_LIBRARY_MANIFESTS = ('pyproject.toml', 'setup.py', 'setup.cfg')
+APPLICATION_ENTRY_POINTS = ('main.py', 'app.py', 'manage.py', 'wsgi.py', 'asgi.py', '__main__.py')
+DOCUMENTATION_EXTENSIONS = ('.md', '.rst', '.txt', '.adoc')
+INFRASTRUCTURE_EXTENSIONS = ('.tf', '.tfvars', '.hcl')
+SOURCE_FILE_EXTENSIONS = ('.py', '.js', '.jsx', '.ts', '.tsx', '.go', '.java', '.rs', '.c', '.cc', '.cpp', '.rb', '.php', '.cs')
+
+
+def guess_repository_type(paths):
+    """
+    Classify the repository from its file layout alone. Returns None when the layout
+    is not conclusive, in which case the LLM decides.
+    """
+    if not paths:
+        return None
+    lowered = [path.lower() for path in paths]
+    filenames = [path.rpartition('/')[2] for path in lowered]
+
+    # Several package manifests under a packages/, apps/, ... directory
+    nested_manifests = sum(
+        1 for path, filename in zip(lowered, filenames)
+        if filename in PACKAGE_MANIFESTS and path.partition('/')[0] in MONOREPO_DIRS and path.count('/') >= 2
+    )
+    if nested_manifests >= 2:
+        return "monorepo"
+
+    code_files = sum(1 for filename in filenames if filename.endswith(SOURCE_FILE_EXTENSIONS))
+
+    # Terraform or Helm charts with little application code
+    infrastructure_files = sum(
+        1 for filename in filenames
+        if filename.endswith(INFRASTRUCTURE_EXTENSIONS) or filename == 'chart.yaml'
+    )
+    if infrastructure_files and infrastructure_files >= code_files:
+        return "infrastructure"
+
+    # Mostly prose
+    doc_files = sum(1 for filename in filenames if filename.endswith(DOCUMENTATION_EXTENSIONS))
+    if len(paths) >= 5 and doc_files >= 0.7 * len(paths) and code_files <= 0.1 * len(paths):
+        return "documentation"
+
+    # A packaged Python project without an application entry point
+    if any(path in PYTHON_LIBRARY_MANIFESTS for path in lowered) and not any(
+        filename in APPLICATION_ENTRY_POINTS for filename in filenames
+    ):
+        return "library"
+
+    return None
+
+
+def _request_repository_type(files_data, doc_context=None, use_cache=True, directory_tree=None):
+    # Skip the LLM request when the layout alone is conclusive
+    repo_type = guess_repository_type([path for path, _ in files_data])
+    if repo_type:
+        return repo_type
+
+    # Create directory tree using shared utility, unless FetchRepo already did
+    if directory_tree is None:
+        directory_tree = create_directory_tree(files_data, max_items_per_level=20, max_total_lines=50)
+    if doc_context is None:
+        doc_context = extract_documentation_context(files_data)
     prompt = f"""Analyze this repository directory structure and determine its type. Respond with ONLY ONE of these exact types: monorepo, library, application, framework, documentation, infrastructure, or mixed.
 
 Directory Structure:
@@ -208,13 +835,18 @@ Repository type definitions:
 - mixed
 
 Respond with only the repository type:"""
-    response = call_llm(prompt, use_cache=True)
-    repo_type = response.strip().lower()
-    
-    if shared_context is not None:
-        shared_context["repository_type"] = repo_type
-        print(f"Repository type detected: {repo_type}")
-    return repo_type
+    response = call_llm(prompt, use_cache=use_cache)
+    return response.strip().lower()
+
+
+# Documentation categories checked in order by extract_documentation_context:
+# (bucket, match the filename only, terms)
+DOC_CATEGORIES = (
+    ('architecture_docs', False, ('architecture', 'arch', 'design', 'adr')),
+    ('api_docs', False, ('api', 'swagger', 'openapi')),
+    ('design_docs', True, ('design', 'spec', 'specification')),
+    ('contributing_guides', True, ('contributing', 'development', 'dev-guide')),
+)
 
 
 # Extract documentation context from various sources
@@ -231,48 +863,124 @@ def extract_documentation_context(files_data):
     
     for path, content in files_data:
         path_lower = path.lower()
-        filename = os.path.basename(path_lower)
+        filename = path_lower.rpartition('/')[2]
         
         # README files
         if filename.startswith('readme'):
-            doc_context['readme_content'] = content  # First 2000 chars for context
-        
-        # Architecture documentation
-        elif any(term in path_lower for term in ['architecture', 'arch', 'design', 'adr']):
-            doc_context['architecture_docs'].append({
-                'path': path,
-                'content': content[:5000]  # First 1000 chars
-            })
+            doc_context['readme_content'] = content  # Full README, trimmed where it is used
+            continue
         
-        # API documentation
-        elif any(term in path_lower for term in ['api', 'swagger', 'openapi']):
-            doc_context['api_docs'].append({
-                'path': path,
-                'content': content[:2000]
-            })
-        
-        # Design documents
-        elif any(term in filename for term in ['design', 'spec', 'specification']):
-            doc_context['design_docs'].append({
-                'path': path,
-                'content': content[:2000]
-            })
-        
-        # Contributing guides
-        elif any(term in filename for term in ['contributing', 'development', 'dev-guide']):
-            doc_context['contributing_guides'].append({
-                'path': path,
-                'content': content[:2000]
-            })
-        
-        # Documentation structure (files in docs directories)
-        elif '/docs/' in path_lower or path_lower.startswith('docs/'):
-            doc_context['docs_structure'].append(path)
+        # First matching category wins. Contents are stored by reference (not copied
+        # prefixes); truncate them where they are put into a prompt
+        for bucket, match_filename_only, terms in DOC_CATEGORIES:
+            target = filename if match_filename_only else path_lower
+            if any(term in target for term in terms):
+                doc_context[bucket].append({
+                    'path': path,
+                    'content': content
+                })
+                break
+        else:
+            # Documentation structure (files in docs directories)
+            if '/docs/' in path_lower or path_lower.startswith('docs/'):
+                doc_context['docs_structure'].append(path)
     
     return doc_context
 
 
-class FetchRepo(Node):
+# Documentation context of shared["files"], extracted once per run
+def get_documentation_context(shared):
+    if "documentation_context" not in shared:
+        shared["documentation_context"] = extract_documentation_context(shared["files"])
+    return shared["documentation_context"]
+
+
+# How each analysis prompt is told to use the documentation found, per doc_context bucket
+DOCUMENTATION_NOTE_PHRASES = {
+    "abstractions": {
+        "readme_content": "README content available - use it to understand project goals and key components. ",
+        "architecture_docs": "Architecture docs found ({count}) - leverage for system design insights. ",
+        "api_docs": "API documentation available ({count}) - prioritize documented interfaces. ",
+        "design_docs": "Design documents found ({count}) - use for understanding intended abstractions. ",
+        "docs_structure": "Documentation structure in /docs/ directory - consider documented components as higher priority.",
+    },
+    "relationships": {
+        "readme_content": "README content available - use it to understand project goals and key component relationships. ",
+        "architecture_docs": "Architecture docs found ({count}) - leverage for system design relationships. ",
+        "api_docs": "API documentation available ({count}) - prioritize documented interface relationships. ",
+        "design_docs": "Design documents found ({count}) - use for understanding intended component relationships. ",
+        "docs_structure": "Documentation structure in /docs/ directory - consider documented component relationships as higher priority.",
+    },
+}
+
+
+def get_documentation_context_note(shared, focus):
+    """
+    The **Documentation Context** line of the analysis prompts for focus ("abstractions"
+    or "relationships"), built once per run from the documentation context.
+    """
+    notes = shared.setdefault("documentation_context_notes", {})
+    if focus not in notes:
+        doc_context = get_documentation_context(shared)
+        phrases = DOCUMENTATION_NOTE_PHRASES[focus]
+        note = "".join(
+            phrase.format(count=len(doc_context[bucket]))
+            for bucket, phrase in phrases.items()
+            if doc_context[bucket]
+        )
+        if not doc_context["docs_structure"]:
+            note += "No structured documentation directory found."
+        notes[focus] = note
+    return notes[focus]
+
+
+class RetryNode(Node):
+    """
+    Node whose retries back off exponentially with jitter. Retry n waits
+    min(wait * 2**n + random(0, 1), max_wait) seconds, so nodes failing at the same
+    time (e.g. on provider rate limits) don't all retry in lockstep.
+    """
+
+    def __init__(self, max_retries=1, wait=0, max_wait=60):
+        super().__init__(max_retries=max_retries, wait=wait)
+        self.max_wait = max_wait
+
+    def _retry_delay(self, attempt):
+        return min(self.wait * 2**attempt + random.uniform(0, 1), self.max_wait)
+
+    def _exec(self, prep_res):
+        for self.cur_retry in range(self.max_retries):
+            try:
+                return self.exec(prep_res)
+            except Exception as e:
+                if self.cur_retry == self.max_retries - 1:
+                    return self.exec_fallback(prep_res, e)
+                if self.wait > 0:
+                    time.sleep(self._retry_delay(self.cur_retry))
+
+
+class AsyncRetryNode(AsyncNode, RetryNode):
+    """
+    Async counterpart of RetryNode. List it after a batch base class to back off per item.
+    Batch items run concurrently on one instance, so instead of cur_retry the attempt
+    number is passed to exec_attempt_async; override that to see it.
+    """
+
+    async def exec_attempt_async(self, prep_res, attempt):
+        return await self.exec_async(prep_res)
+
+    async def _exec(self, prep_res):
+        for attempt in range(self.max_retries):
+            try:
+                return await self.exec_attempt_async(prep_res, attempt)
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    return await self.exec_fallback_async(prep_res, e)
+                if self.wait > 0:
+                    await asyncio.sleep(self._retry_delay(attempt))
+
+
+class FetchRepo(RetryNode):
     def prep(self, shared):
         repo_url = shared.get("repo_url")
         local_dir = shared.get("local_dir")
@@ -281,7 +989,7 @@ class FetchRepo(Node):
         if not project_name:
             # Basic name derivation from URL or directory
             if repo_url:
-                project_name = repo_url.split("/")[-1].replace(".git", "")
+                project_name = repo_url.rpartition("/")[2].removesuffix(".git")
             else:
                 project_name = os.path.basename(os.path.abspath(local_dir))
             shared["project_name"] = project_name
@@ -342,51 +1050,161 @@ class FetchRepo(Node):
     def post(self, shared, prep_res, exec_res):
         shared["files"] = exec_res["files"]  # List of (path, content) tuples
         shared["git_info"] = exec_res["git_info"]  # Git repository information
+        shared["repo_fingerprint"] = compute_repo_fingerprint(exec_res["files"])
+        # Built once from the paths, which stay the same for the whole run; used by the
+        # repository type detection and the index page
+        shared["directory_tree"] = create_directory_tree(
+            exec_res["files"], max_items_per_level=20, max_total_lines=50
+        )
+
+
+class TutorialCache(RetryNode):
+    """
+    Looks up a previously generated tutorial for the same files and settings.
+    On a hit, restores its results into shared and returns the "done" action so the
+    flow goes straight to CombineTutorial; CombineTutorial saves new results.
+    """
+
+    def prep(self, shared):
+        if not shared.get("use_cache", True):
+            return None
+        return tutorial_cache_key(shared)
+
+    def exec(self, prep_res):
+        if prep_res is None:
+            return None
+        return load_cached_tutorial(prep_res)
+
+    def post(self, shared, prep_res, exec_res):
+        if not exec_res:
+            # Start repository type detection now so it overlaps with IdentifyAbstractions
+            # building its context; detect_repository_type waits for the result. Only on
+            # a miss, so a cached tutorial costs no LLM request
+            if "repository_type" not in shared:
+                shared["repository_type_future"] = BACKGROUND_EXECUTOR.submit(
+                    _request_repository_type,
+                    shared["files"],
+                    get_documentation_context(shared),
+                    use_cache=shared.get("use_cache", True),
+                    directory_tree=shared["directory_tree"],
+                )
+            return "default"
+        print("Found a cached tutorial for this repository state, skipping generation.")
+        shared.update(exec_res)
+        shared["tutorial_cache_hit"] = True  # Already cached, so CombineTutorial doesn't save it again
+        return "done"
+
+
+class CondenseFiles(RetryNode):
+    """
+    Optionally reduces source files to outlines (signatures and docstrings) for the
+    prompts of IdentifyAbstractions and AnalyzeRelationships. Full contents stay in
+    shared["files"] for the code excerpts in WriteChapters.
+    """
+
+    def prep(self, shared):
+        if not shared.get("condense_files"):
+            return None
+        return shared["files"]
+
+    def exec(self, prep_res):
+        if prep_res is None:
+            return None
+        condensed = condense_files(prep_res)
+        original_size = sum(len(content) for _, content in prep_res)
+        condensed_size = sum(len(content) for _, content in condensed)
+        print(f"Condensed files for analysis: {original_size} -> {condensed_size} characters.")
+        return condensed
+
+    def post(self, shared, prep_res, exec_res):
+        shared["files_condensed"] = exec_res  # None when condensing is disabled
+        # Analysis runs as one combined request with --single-pass, two requests otherwise
+        return "single_pass" if shared.get("single_pass") else "default"
 
 
-class IdentifyAbstractions(Node):
+class IdentifyAbstractions(RetryNode):
     def prep(self, shared):
         ctx = get_common_context(shared)
         max_abstraction_num = shared.get("max_abstraction_num", 20)
 
         # Helper to create context from files, prioritizing contextual files
-        def create_llm_context(files_data):
-            # Separate contextual files (README, docs, etc.) from code files
-            contextual_files = []
-            code_files = []
+        def create_llm_context(files_data, max_file_chars, max_total_chars):
+            # Separate contextual files (README, docs, etc.) from code files, by index
+            contextual_indices = []
+            code_indices = []
             
-            for i, (path, content) in enumerate(files_data):
-                filename = path.lower().split('/')[-1]
-                if any(ctx_file in filename for ctx_file in ['readme', 'doc', 'guide', 'overview', 'architecture']):
-                    contextual_files.append((i, path, content))
+            for i, (path, _) in enumerate(files_data):
+                filename = path.lower().rpartition('/')[2]
+                if CONTEXTUAL_FILE_PATTERN.search(filename):
+                    contextual_indices.append(i)
                 else:
-                    code_files.append((i, path, content))
+                    code_indices.append(i)
             
             # Build context with contextual files first, then code files
-            context = ""
+            # (parts are joined once at the end; repeated += copies the growing string)
+            parts = []
             file_info = []  # Store tuples of (index, path)
+            remaining = max_total_chars
+
+            def truncated(content, limit):
+                if len(content) <= limit:
+                    return content
+                return content[:limit] + "\n... [truncated]"
             
-            # Add contextual files first for better understanding
-            if contextual_files:
-                context += "=== PROJECT CONTEXT AND DOCUMENTATION ===\n\n"
-                for i, path, content in contextual_files:
-                    entry = f"--- File Index {i}: {path} (CONTEXTUAL) ---\n{content}\n\n"
-                    context += entry
+            # Add contextual files first for better understanding; they are always included
+            if contextual_indices:
+                parts.append("=== PROJECT CONTEXT AND DOCUMENTATION ===\n\n")
+                for i in contextual_indices:
+                    path, content = files_data[i]
+                    content = truncated(content, max_file_chars)
+                    remaining -= len(content)
+                    parts.append(f"--- File Index {i}: {path} (CONTEXTUAL) ---\n")
+                    parts.append(content)
+                    parts.append("\n\n")
                     file_info.append((i, path))
-                context += "\n=== CODE FILES ===\n\n"
+                parts.append("\n=== CODE FILES ===\n\n")
             
-            # Add code files
-            for i, path, content in code_files:
-                entry = f"--- File Index {i}: {path} ---\n{content}\n\n"
-                context += entry
+            # Add code files until the budget is used up
+            for n, i in enumerate(code_indices):
+                if remaining <= 0:
+                    parts.append(f"... ({len(code_indices) - n} more code files omitted to fit the context budget)\n\n")
+                    break
+                path, content = files_data[i]
+                content = truncated(content, min(max_file_chars, remaining))
+                remaining -= len(content)
+                parts.append(f"--- File Index {i}: {path} ---\n")
+                parts.append(content)
+                parts.append("\n\n")
                 file_info.append((i, path))
 
-            return context, file_info, len(contextual_files)  # Return contextual file count
-
-        context, file_info, contextual_file_count = create_llm_context(ctx["files_data"])
+            context = "".join(parts)
+
+            # Listing for the prompt, built from the entries above instead of re-parsing the context
+            file_listing = "\n".join(f"- {i} # {path}" for i, path in file_info)
+            return context, file_listing
+
+        # Formatting the context is skipped when the same files were already processed
+        prompt_files = shared.get("files_condensed") or ctx["files_data"]
+        budget = {**LLM_CONTEXT_BUDGET, **(shared.get("llm_context_budget") or {})}
+        memo_key = (
+            shared.get("repo_fingerprint"),
+            LLM_CONTEXT_VERSION,
+            bool(shared.get("files_condensed")),
+            budget["max_file_chars"],
+            budget["max_total_chars"],
+        )
+        if memo_key[0] and memo_key in _llm_context_memo:
+            context, file_listing = _llm_context_memo[memo_key]
+        else:
+            context, file_listing = create_llm_context(
+                prompt_files, budget["max_file_chars"], budget["max_total_chars"]
+            )
+            if memo_key[0]:
+                _llm_context_memo.clear()
+                _llm_context_memo[memo_key] = (context, file_listing)
         # Detect repository type and extract documentation context for better guidance
         repo_type = detect_repository_type(ctx["files_data"], shared)
-        doc_context = extract_documentation_context(ctx["files_data"])
+        doc_note = get_documentation_context_note(shared, "abstractions")
         
         return (
             context,
@@ -395,9 +1213,9 @@ class IdentifyAbstractions(Node):
             ctx["language"],
             ctx["use_cache"],
             max_abstraction_num,
-            contextual_file_count,
+            file_listing,
             repo_type,
-            doc_context,
+            doc_note,
         )  # Return all parameters
 
     def exec(self, prep_res):
@@ -408,160 +1226,73 @@ class IdentifyAbstractions(Node):
             language,
             use_cache,
             max_abstraction_num,
-            contextual_file_count,
+            file_listing,
             repo_type,
-            doc_context,
+            doc_note,
         ) = prep_res  # Unpack all parameters
         print(f"Identifying abstractions using LLM...")
 
+        prompt = self._build_prompt(
+            prep_res,
+            "the `name` and `description` for each abstraction",
+            f"Identify the 1-{max_abstraction_num} top core code abstractions in this repository.",
+        )
+        response = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0), system_prompt=IDENTIFY_ABSTRACTIONS_PREFIX)  # Use cache only if enabled and not retrying
+
+        # --- Validation ---
+        validated_abstractions = validate_abstractions(
+            parse_yaml_from_llm_response(response), file_count
+        )
+
+        print(f"Identified {len(validated_abstractions)} abstractions.")
+        return validated_abstractions
+
+    def post(self, shared, prep_res, exec_res):
+        shared["abstractions"] = (
+            exec_res  # List of {"name": str, "description": str, "files": [int]}
+        )
+
+    def _build_prompt(self, prep_res, localized_fields, task):
+        """Run-specific part of the prompt; the static instructions are sent as the system prompt."""
+        (
+            context,
+            file_count,
+            project_name,
+            language,
+            use_cache,
+            max_abstraction_num,
+            file_listing,
+            repo_type,
+            doc_note,
+        ) = prep_res
+
         # Get language context
         lang_ctx = get_language_context(language)
         language_instruction = ""
-        name_lang_hint = ""
-        desc_lang_hint = ""
         
         if lang_ctx["is_non_english"]:
-            language_instruction = f"IMPORTANT: Generate the `name` and `description` for each abstraction in **{lang_ctx['lang_cap']}** language. Do NOT use English for these fields.\n\n"
-            name_lang_hint = f" (value in {lang_ctx['lang_cap']})"
-            desc_lang_hint = f" (value in {lang_ctx['lang_cap']})"
-
-        prompt = f"""
-## Role and Task
-You are an expert software architect and technical documentation specialist. Your task is to identify the 1-{max_abstraction_num} top core code abstractions in this repository for comprehensive wiki documentation that serves as a definitive reference for developers.
-
-## Critical Requirements
-{STRICT_ACCURACY_REQUIREMENTS}
+            language_instruction = f"IMPORTANT: Generate {localized_fields} in **{lang_ctx['lang_cap']}** language. Do NOT use English for these fields (the output format example shows English values only for illustration).\n\n"
 
+        # Static instructions go in the system prompt (IDENTIFY_ABSTRACTIONS_PREFIX) so the
+        # provider can cache that prefix; everything run-specific follows in the request
+        return f"""
 ## Context
 **Project**: `{project_name}`
 **Available Files**:
-{self._generate_file_listing_for_prompt(contextual_file_count, file_count, context)}
+{file_listing}
 
-**Documentation Context**: {f'README content available - use it to understand project goals and key components. ' if doc_context['readme_content'] else ''}{f'Architecture docs found ({len(doc_context["architecture_docs"])}) - leverage for system design insights. ' if doc_context['architecture_docs'] else ''}{f'API documentation available ({len(doc_context["api_docs"])}) - prioritize documented interfaces. ' if doc_context['api_docs'] else ''}{f'Design documents found ({len(doc_context["design_docs"])}) - use for understanding intended abstractions. ' if doc_context['design_docs'] else ''}{f'Documentation structure in /docs/ directory - consider documented components as higher priority.' if doc_context['docs_structure'] else 'No structured documentation directory found.'}
+**Documentation Context**: {doc_note}
 
-**Repository Type**: {repo_type} - {'Focus on distinct functional areas and services across multiple packages/modules.' if repo_type == 'monorepo' else 'Focus on public APIs, core algorithms, and main interfaces that users interact with.' if repo_type == 'library' else 'Prioritize business logic components, data models, and user-facing features over infrastructure.' if repo_type == 'application' else 'Emphasize extensibility points, plugin systems, and core processing engines.' if repo_type == 'framework' else 'Focus on content organization, generation systems, and publishing workflows.' if repo_type == 'documentation' else 'Focus on deployment configurations, infrastructure components, and automation systems.' if repo_type == 'infrastructure' else 'Analyze the primary purpose first, then apply appropriate abstraction strategy.'}
+**Repository Type**: {repo_type} - {IDENTIFY_REPO_TYPE_GUIDANCE.get(repo_type, IDENTIFY_REPO_TYPE_GUIDANCE['mixed'])}
 
 ## Codebase to Analyze
 {context}
 
-{language_instruction}## Required Output Format
-Provide your analysis as a YAML list following this exact structure:
-
-```yaml
-- name: |
-    Core Authentication System{name_lang_hint}
-  description: |
-    Manages user authentication, session handling, and access control across the application.
-    Serves as the central security gateway that validates user credentials and permissions.{desc_lang_hint}
-  file_indices:
-    - 0 # auth/login.py
-    - 2 # middleware/auth.py
-- name: |
-    Data Processing Pipeline{name_lang_hint}
-  description: |
-    Transforms raw input data through multiple validation and processing stages.
-    Acts as the core data transformation engine that ensures data quality and format consistency.{desc_lang_hint}
-  file_indices:
-    - 1 # processors/main.py
-    - 4 # utils/transform.py
-```"""
-        response = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0))  # Use cache only if enabled and not retrying
-
-        # --- Validation ---
-        abstractions = parse_yaml_from_llm_response(response)
-
-        if not isinstance(abstractions, list):
-            raise ValueError("LLM Output is not a list")
-
-        validated_abstractions = []
-        for item in abstractions:
-            if not isinstance(item, dict) or not all(
-                k in item for k in ["name", "description", "file_indices"]
-            ):
-                raise ValueError(f"Missing keys in abstraction item: {item}")
-            if not isinstance(item["name"], str):
-                raise ValueError(f"Name is not a string in item: {item}")
-            if not isinstance(item["description"], str):
-                raise ValueError(f"Description is not a string in item: {item}")
-            if not isinstance(item["file_indices"], list):
-                raise ValueError(f"file_indices is not a list in item: {item}")
-
-            # Validate indices
-            validated_indices = []
-            for idx_entry in item["file_indices"]:
-                try:
-                    if isinstance(idx_entry, int):
-                        idx = idx_entry
-                    elif isinstance(idx_entry, str) and "#" in idx_entry:
-                        idx = int(idx_entry.split("#")[0].strip())
-                    else:
-                        idx = int(str(idx_entry).strip())
-
-                    if not (0 <= idx < file_count):
-                        raise ValueError(
-                            f"Invalid file index {idx} found in item {item['name']}. Max index is {file_count - 1}."
-                        )
-                    validated_indices.append(idx)
-                except (ValueError, TypeError):
-                    raise ValueError(
-                        f"Could not parse index from entry: {idx_entry} in item {item['name']}"
-                    )
-
-            item["files"] = sorted(list(set(validated_indices)))
-            # Store only the required fields
-            validated_abstractions.append(
-                {
-                    "name": item["name"],  # Potentially translated name
-                    "description": item[
-                        "description"
-                    ],  # Potentially translated description
-                    "files": item["files"],
-                }
-            )
-
-        print(f"Identified {len(validated_abstractions)} abstractions.")
-        return validated_abstractions
-
-    def post(self, shared, prep_res, exec_res):
-        shared["abstractions"] = (
-            exec_res  # List of {"name": str, "description": str, "files": [int]}
-        )
-
-    def _generate_file_listing_for_prompt(self, contextual_file_count, file_count, context_str):
-        """Dynamically generates a file listing from the context string, similar to how it was done before."""
-        lines = context_str.split('\n')
-        file_listing = []
-        
-        # Track if we are in the contextual files section or code files section
-        in_contextual_section = False
-        in_code_section = False
-
-        for i, line in enumerate(lines):
-            if "=== PROJECT CONTEXT AND DOCUMENTATION ===" in line:
-                in_contextual_section = True
-                in_code_section = False
-                continue
-            elif "=== CODE FILES ===" in line:
-                in_code_section = True
-                in_contextual_section = False
-                continue
-
-            if in_contextual_section or in_code_section:
-                # Look for lines marking file entries, e.g., "--- File Index X: path ---"
-                match = re.match(r"--- File Index (\d+): (.*?) ---", line)
-                if match:
-                    file_index = match.group(1)
-                    file_path = match.group(2)
-                    file_listing.append(f"- {file_index} # {file_path}")
-        
-        if not file_listing and file_count > 0:
-            # Fallback: if dynamic parsing failed, and files exist, provide a generic message
-            return f"({file_count} files available, details provided in 'Codebase to Analyze' section.)"
-
-        return "\n".join(file_listing)
+{language_instruction}## Task
+{task}"""
 
 
-class AnalyzeRelationships(Node):
+class AnalyzeRelationships(RetryNode):
     def prep(self, shared):
         ctx = get_common_context(shared)
         abstractions = shared[
@@ -572,35 +1303,33 @@ class AnalyzeRelationships(Node):
         num_abstractions = len(abstractions)
 
         # Create context with abstraction names, indices, descriptions, and relevant file snippets
-        context = "Identified Abstractions:\\n"
+        lines = ["Identified Abstractions:"]
         all_relevant_indices = set()
         abstraction_info_for_prompt = []
         for i, abstr in enumerate(abstractions):
             # Use 'files' which contains indices directly
-            file_indices_str = ", ".join(map(str, abstr["files"]))
+            files = abstr["files"]
+            all_relevant_indices.update(files)
             # Abstraction name and description might be translated already
-            info_line = f"- Index {i}: {abstr['name']} (Relevant file indices: [{file_indices_str}])\\n  Description: {abstr['description']}"
-            context += info_line + "\\n"
+            lines.append(f"- Index {i}: {abstr['name']} (Relevant file indices: [{', '.join(map(str, files))}])")
+            lines.append(f"  Description: {abstr['description']}")
             abstraction_info_for_prompt.append(
                 f"{i} # {abstr['name']}"
             )  # Use potentially translated name here too
-            all_relevant_indices.update(abstr["files"])
 
-        context += "\\nRelevant File Snippets (Referenced by Index and Path):\\n"
-        # Get content for relevant files using helper
-        relevant_files_content_map = get_content_for_indices(
-            ctx["files_data"], sorted(list(all_relevant_indices))
-        )
-        # Format file content for context
-        file_context_str = "\\n\\n".join(
-            f"--- File: {idx_path} ---\\n{content}"
-            for idx_path, content in relevant_files_content_map.items()
-        )
-        context += file_context_str
+        lines.append("")
+        lines.append("Relevant File Snippets (Referenced by Index and Path):")
+        # Content of the relevant files (condensed outlines if enabled).
+        # The indices were validated against the file count by validate_abstractions
+        prompt_files = shared.get("files_condensed") or ctx["files_data"]
+        for i in sorted(all_relevant_indices):
+            path, content = prompt_files[i]
+            lines.append(f"--- File: {i} # {path} ---\n{content}\n")
+        context = "\n".join(lines)
         
-        # Detect repository type and extract documentation context for better analysis
+        # Repository type and documentation context were already computed for IdentifyAbstractions
         repo_type = detect_repository_type(ctx["files_data"], shared)
-        doc_context = extract_documentation_context(ctx["files_data"])
+        doc_note = get_documentation_context_note(shared, "relationships")
 
         return (
             context,
@@ -610,7 +1339,7 @@ class AnalyzeRelationships(Node):
             ctx["language"],
             ctx["use_cache"],
             repo_type,
-            doc_context,
+            doc_note,
         )  # Return use_cache and new context
 
     def exec(self, prep_res):
@@ -622,46 +1351,25 @@ class AnalyzeRelationships(Node):
             language,
             use_cache,
             repo_type,
-            doc_context,
+            doc_note,
          ) = prep_res  # Unpack use_cache and new context
-        print(f"Analyzing relationships using LLM...")
+        print(f"Analyzing relationships and chapter order using LLM...")
 
         # Add language instruction and hints only if not English
         language_instruction = ""
-        lang_hint = ""
         list_lang_note = ""
         if language.lower() != "english":
-            language_instruction = f"IMPORTANT: Generate the `summary` and relationship `label` fields in **{language.capitalize()}** language. Do NOT use English for these fields.\n\n"
-            lang_hint = f" (in {language.capitalize()})"
+            language_instruction = f"IMPORTANT: Generate the `summary` and relationship `label` fields in **{language.capitalize()}** language. Do NOT use English for these fields (the output format example shows English values only for illustration).\n\n"
             list_lang_note = f" (Names might be in {language.capitalize()})"  # Note for the input list
 
+        # Static instructions go in the system prompt (ANALYZE_RELATIONSHIPS_PREFIX) so the
+        # provider can cache that prefix; everything run-specific follows in the request
         prompt = f"""
-## Role and Task
-You are an expert software architect and technical documentation specialist. Your task is to analyze code abstractions and their relationships to create a comprehensive project overview for wiki documentation.
-
-## Critical Requirements
-{STRICT_ACCURACY_REQUIREMENTS}
-
-**IMPORTANT**: Base your analysis ONLY on the actual code and abstractions provided. Do NOT:
-- Reference external frameworks, libraries, or tools not shown in the code
-- Create fictional documentation links, URLs, or external resources
-- Mention design patterns or concepts not clearly evident in the provided code
-- Assume relationships that aren't explicitly demonstrated in the code
-
-## Analysis Instructions
-1. **Create a concise project summary** that objectively describes what this codebase accomplishes, its primary purpose, and key capabilities
-2. **Map concrete relationships** between abstractions based on verifiable code interactions (imports, function calls, inheritance, data flow, configuration)
-3. **Prioritize significant relationships** - focus on connections that are architecturally important, not every minor interaction
-4. **Use neutral, encyclopedic tone** - precise technical language that remains accessible
-5. **Focus on architectural clarity** - provide a clear mental model of the system's structure
-6. **Maintain proportional emphasis** - give more attention to core system relationships, less to peripheral connections
-7. **Ensure complete coverage** - every abstraction should be connected to the overall system design
-
 ## Context
 **Project**: `{project_name}`
-**Repository Type**: {repo_type.title()} - {'Focus on relationships between distinct functional areas and services across multiple packages/modules.' if repo_type == 'monorepo' else 'Emphasize public API relationships, core algorithm interactions, and main interface connections.' if repo_type == 'library' else 'Prioritize business logic relationships, data flow between models, and user-facing feature connections.' if repo_type == 'application' else 'Focus on extensibility relationships, plugin system connections, and core processing engine interactions.' if repo_type == 'framework' else 'Emphasize content organization relationships, generation system connections, and publishing workflow interactions.' if repo_type == 'documentation' else 'Focus on deployment relationships, infrastructure component connections, and automation system interactions.' if repo_type == 'infrastructure' else 'Analyze the primary relationships first, then apply appropriate connection strategy.'}
+**Repository Type**: {repo_type.title()} - {ANALYZE_REPO_TYPE_GUIDANCE.get(repo_type, ANALYZE_REPO_TYPE_GUIDANCE['mixed'])}
 
-**Documentation Context**: {f'README content available - use it to understand project goals and key component relationships. ' if doc_context['readme_content'] else ''}{f'Architecture docs found ({len(doc_context["architecture_docs"])}) - leverage for system design relationships. ' if doc_context['architecture_docs'] else ''}{f'API documentation available ({len(doc_context["api_docs"])}) - prioritize documented interface relationships. ' if doc_context['api_docs'] else ''}{f'Design documents found ({len(doc_context["design_docs"])}) - use for understanding intended component relationships. ' if doc_context['design_docs'] else ''}{f'Documentation structure in /docs/ directory - consider documented component relationships as higher priority.' if doc_context['docs_structure'] else 'No structured documentation directory found.'}
+**Documentation Context**: {doc_note}
 
 **Identified Abstractions**{list_lang_note}:
 {abstraction_listing}
@@ -669,297 +1377,166 @@ You are an expert software architect and technical documentation specialist. You
 **Detailed Analysis Context**:
 {context}
 
-{language_instruction}## Required Output
-Provide a YAML response with two sections:
-
-### 1. Project Summary
-Write a concise overview explaining what this project does, its main purpose, and key functionality. Focus on essential information only. Use **bold** and *italic* markdown for emphasis.
-
-### 2. Relationships
-List relationships between abstractions based on actual code interactions. Each relationship must specify:
-- `from_abstraction`: Source abstraction index and name
-- `to_abstraction`: Target abstraction index and name  
-- `label`: Brief technical description of the relationship
-
-**Relationship Types to Look For**:
-- Function/method calls between abstractions
-- Data passing or transformation
-- Inheritance or composition
-- Configuration or initialization
-- Event handling or callbacks
-
-## Output Format
-```yaml
-summary: |
-  This project implements a **web scraping framework** that processes data through multiple stages.
-  The system uses a *pipeline architecture* where data flows from collectors to processors to storage.{lang_hint}
-relationships:
-  - from_abstraction: 0 # DataCollector
-    to_abstraction: 1 # DataProcessor
-    label: "Feeds raw data"{lang_hint}
-  - from_abstraction: 1 # DataProcessor
-    to_abstraction: 2 # DataStorage
-    label: "Stores processed results"{lang_hint}
-  - from_abstraction: 3 # ConfigManager
-    to_abstraction: 0 # DataCollector
-    label: "Provides settings"{lang_hint}
-```
-
-**Remember**: Only describe relationships and functionality that are clearly evident in the provided code context."""
-        response = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0)) # Use cache only if enabled and not retrying
+{language_instruction}"""
+        response = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0), system_prompt=ANALYZE_RELATIONSHIPS_PREFIX) # Use cache only if enabled and not retrying
 
         # --- Validation ---
         relationships_data = parse_yaml_from_llm_response(response)
 
         if not isinstance(relationships_data, dict) or not all(
-            k in relationships_data for k in ["summary", "relationships"]
+            k in relationships_data for k in ["summary", "relationships", "chapter_order"]
         ):
             raise ValueError(
-                "LLM output is not a dict or missing keys ('summary', 'relationships')"
+                "LLM output is not a dict or missing keys ('summary', 'relationships', 'chapter_order')"
             )
         if not isinstance(relationships_data["summary"], str):
             raise ValueError("summary is not a string")
-        if not isinstance(relationships_data["relationships"], list):
-            raise ValueError("relationships is not a list")
-
-        # Validate relationships structure
-        validated_relationships = []
-        for rel in relationships_data["relationships"]:
-            # Check for 'label' key
-            if not isinstance(rel, dict) or not all(
-                k in rel for k in ["from_abstraction", "to_abstraction", "label"]
-            ):
-                raise ValueError(
-                    f"Missing keys (expected from_abstraction, to_abstraction, label) in relationship item: {rel}"
-                )
-            # Validate 'label' is a string
-            if not isinstance(rel["label"], str):
-                raise ValueError(f"Relationship label is not a string: {rel}")
-
-            # Validate indices
-            try:
-                from_idx = int(str(rel["from_abstraction"]).split("#")[0].strip())
-                to_idx = int(str(rel["to_abstraction"]).split("#")[0].strip())
-                if not (
-                    0 <= from_idx < num_abstractions and 0 <= to_idx < num_abstractions
-                ):
-                    raise ValueError(
-                        f"Invalid index in relationship: from={from_idx}, to={to_idx}. Max index is {num_abstractions-1}."
-                    )
-                validated_relationships.append(
-                    {
-                        "from": from_idx,
-                        "to": to_idx,
-                        "label": rel["label"],  # Potentially translated label
-                    }
-                )
-            except (ValueError, TypeError):
-                raise ValueError(f"Could not parse indices from relationship: {rel}")
+        validated_relationships = validate_relationships(
+            relationships_data["relationships"], num_abstractions
+        )
+        ordered_indices = validate_chapter_order(
+            relationships_data["chapter_order"], num_abstractions
+        )
 
         print("Generated project summary and relationship details.")
+        print(f"Determined chapter order (indices): {ordered_indices}")
         return {
             "summary": relationships_data["summary"],  # Potentially translated summary
             "details": validated_relationships,  # Store validated, index-based relationships with potentially translated labels
+            "chapter_order": ordered_indices,
         }
 
     def post(self, shared, prep_res, exec_res):
         # Structure is now {"summary": str, "details": [{"from": int, "to": int, "label": str}]}
         # Summary and label might be translated
-        shared["relationships"] = exec_res
-
-
-class OrderChapters(Node):
-    def prep(self, shared):
-        ctx = get_common_context(shared)
-        abstractions = shared["abstractions"]  # Name/description might be translated
-        relationships = shared["relationships"]  # Summary/label might be translated
-
-        # Prepare context for the LLM
-        abstraction_info_for_prompt = []
-        for i, a in enumerate(abstractions):
-            abstraction_info_for_prompt.append(
-                f"- {i} # {a['name']}"
-            )  # Use potentially translated name
-        abstraction_listing = "\n".join(abstraction_info_for_prompt)
-
-        # Use potentially translated summary and labels
-        lang_ctx = get_language_context(ctx["language"])
-        summary_note = lang_ctx["lang_note"].replace("Provided", "Project Summary might be")
-
-        context = f"Project Summary{summary_note}:\n{relationships['summary']}\n\n"
-        context += "Relationships (Indices refer to abstractions above):\n"
-        for rel in relationships["details"]:
-            from_name = abstractions[rel["from"]]["name"]
-            to_name = abstractions[rel["to"]]["name"]
-            # Use potentially translated 'label'
-            context += f"- From {rel['from']} ({from_name}) to {rel['to']} ({to_name}): {rel['label']}\n"  # Label might be translated
+        shared["relationships"] = {
+            "summary": exec_res["summary"],
+            "details": exec_res["details"],
+        }
+        shared["chapter_order"] = exec_res["chapter_order"]  # List of indices
 
-        list_lang_note = lang_ctx["lang_note"].replace("Provided", "Names might be")
 
-        return (
-            abstraction_listing,
-            context,
-            len(abstractions),
-            ctx["project_name"],
-            list_lang_note,
-            ctx["use_cache"],
-        )  # Return use_cache
+class IdentifyAndRelate(IdentifyAbstractions):
+    """
+    IdentifyAbstractions and AnalyzeRelationships in a single LLM request (--single-pass),
+    so the codebase context is sent and processed once instead of twice.
+    """
 
     def exec(self, prep_res):
         (
-            abstraction_listing,
             context,
-            num_abstractions,
+            file_count,
             project_name,
-            list_lang_note,
+            language,
             use_cache,
-        ) = prep_res  # Unpack use_cache
-        print("Determining chapter order using LLM...")
-        # No language variation needed here in prompt instructions, just ordering based on structure
-        # The input names might be translated, hence the note.
-        prompt = f"""
-## Role and Task
-You are an expert software architect and technical documentation specialist. Your task is to determine the optimal organization for presenting code abstractions in a comprehensive wiki for `{project_name}`.
-
-## Critical Requirements
-{STRICT_ACCURACY_REQUIREMENTS}
-
-**IMPORTANT**: Base your ordering decisions ONLY on the actual abstractions and relationships provided. Do NOT:
-- Reference external concepts, frameworks, or patterns not shown in the context
-- Assume dependencies that aren't clearly demonstrated
-- Create fictional prerequisites or dependencies
-- Mention concepts not explicitly present in the provided abstractions
-
-## Organization Strategy
-Apply these principles to create a **logical reference structure** that serves developers seeking to understand the project's key functionality:
-
-1. **Primary Functionality**: Start with abstractions that directly implement the project's main purpose and core features
-2. **System Entry Points**: Present main interfaces, APIs, or user-facing components that provide access to core functionality
-3. **Core Architecture**: Cover fundamental abstractions that define the system's structure and design patterns
-4. **Business Logic**: Include domain-specific functionality, algorithms, and processing components
-5. **Data Management**: Present data structures, models, and persistence layers
-6. **Supporting Infrastructure**: Include configuration, utilities, and helper components
-7. **Proportional Emphasis**: Order components based on their actual importance to the system's core functionality
-8. **Reference Logic**: Order for comprehensive understanding
-
-## Context
-**Project**: `{project_name}`
-**Available Abstractions**{list_lang_note}:
-{abstraction_listing}
-
-**Relationships and Project Overview**:
-{context}
-
-## Required Output
-Provide a YAML list with the optimal organization for presenting these abstractions in a wiki. Each entry should be the abstraction index followed by its name as a comment.
-
-**Consider This Reference Organization Logic**:
-- Which abstractions serve as the primary system interfaces or entry points?
-- What are the fundamental architectural components that define the system?
-- Which abstractions contain the core domain logic and business functionality?
-- What supporting infrastructure is architecturally significant (avoid over-emphasizing minor utilities)?
-- How much of the system's behavior depends on each component?
-- How should components be ordered to reflect their actual importance to the system?
-- How can the organization enable effective cross-referencing without redundant coverage?
-
-## Output Format
-```yaml
-- 0 # CoreDataStructure
-- 2 # ConfigurationManager  
-- 1 # MainProcessor
-- 3 # OutputHandler
-```
-
-**Remember**: Base your ordering only on the relationships and functionality clearly shown in the provided context."""
-        response = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0)) # Use cache only if enabled and not retrying
+            max_abstraction_num,
+            file_listing,
+            repo_type,
+            doc_note,
+        ) = prep_res  # Same inputs as IdentifyAbstractions
+        print(f"Identifying abstractions, relationships and chapter order using LLM...")
+
+        prompt = self._build_prompt(
+            prep_res,
+            "the `name` and `description` of each abstraction, the `summary` and the relationship `label` fields",
+            f"Identify the 1-{max_abstraction_num} top core code abstractions in this repository, then summarize the project, map the relationships between the abstractions and order their chapters.",
+        )
+        response = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0), system_prompt=IDENTIFY_AND_RELATE_PREFIX)  # Use cache only if enabled and not retrying
 
         # --- Validation ---
-        ordered_indices_raw = parse_yaml_from_llm_response(response)
-
-        if not isinstance(ordered_indices_raw, list):
-            raise ValueError("LLM output is not a list")
-
-        ordered_indices = []
-        seen_indices = set()
-        for entry in ordered_indices_raw:
-            try:
-                if isinstance(entry, int):
-                    idx = entry
-                elif isinstance(entry, str) and "#" in entry:
-                    idx = int(entry.split("#")[0].strip())
-                else:
-                    idx = int(str(entry).strip())
-
-                if not (0 <= idx < num_abstractions):
-                    raise ValueError(
-                        f"Invalid index {idx} in ordered list. Max index is {num_abstractions-1}."
-                    )
-                if idx in seen_indices:
-                    raise ValueError(f"Duplicate index {idx} found in ordered list.")
-                ordered_indices.append(idx)
-                seen_indices.add(idx)
-
-            except (ValueError, TypeError):
-                raise ValueError(
-                    f"Could not parse index from ordered list entry: {entry}"
-                )
-
-        # Check if all abstractions are included
-        if len(ordered_indices) != num_abstractions:
+        data = parse_yaml_from_llm_response(response)
+        if not isinstance(data, dict) or not all(
+            k in data for k in ["abstractions", "summary", "relationships", "chapter_order"]
+        ):
             raise ValueError(
-                f"Ordered list length ({len(ordered_indices)}) does not match number of abstractions ({num_abstractions}). Missing indices: {set(range(num_abstractions)) - seen_indices}"
+                "LLM output is not a dict or missing keys ('abstractions', 'summary', 'relationships', 'chapter_order')"
             )
+        if not isinstance(data["summary"], str):
+            raise ValueError("summary is not a string")
+        validated_abstractions = validate_abstractions(data["abstractions"], file_count)
+        validated_relationships = validate_relationships(
+            data["relationships"], len(validated_abstractions)
+        )
+        ordered_indices = validate_chapter_order(
+            data["chapter_order"], len(validated_abstractions)
+        )
 
+        print(f"Identified {len(validated_abstractions)} abstractions.")
         print(f"Determined chapter order (indices): {ordered_indices}")
-        return ordered_indices  # Return the list of indices
+        return {
+            "abstractions": validated_abstractions,
+            "summary": data["summary"],
+            "details": validated_relationships,
+            "chapter_order": ordered_indices,
+        }
 
     def post(self, shared, prep_res, exec_res):
-        # exec_res is already the list of ordered indices
-        shared["chapter_order"] = exec_res  # List of indices
+        shared["abstractions"] = exec_res["abstractions"]
+        shared["relationships"] = {
+            "summary": exec_res["summary"],
+            "details": exec_res["details"],
+        }
+        shared["chapter_order"] = exec_res["chapter_order"]
 
 
-class WriteChapters(BatchNode):
-    def prep(self, shared):
+class WriteChapters(AsyncParallelBatchNode, AsyncRetryNode):
+    def __init__(self, max_retries=1, wait=0, max_concurrency=4, batch_size=1):
+        super().__init__(max_retries=max_retries, wait=wait)
+        # Upper bound on chapter requests in flight at once (provider RPM limits)
+        self.max_concurrency = max_concurrency
+        # Number of chapters written per LLM request (1 = one request per chapter)
+        self.batch_size = max(1, batch_size)
+
+    async def prep_async(self, shared):
         ctx = get_common_context(shared)
         chapter_order = shared["chapter_order"]  # List of indices
         abstractions = shared[
             "abstractions"
         ]  # List of {"name": str, "description": str, "files": [int]}
 
-        # Get already written chapters to provide context
-        # We store them temporarily during the batch run, not in shared memory yet
-        # The 'previous_chapters_summary' will be built progressively in the exec context
-        self.chapters_written_so_far = (
-            []
-        )  # Use instance variable for temporary storage across exec calls
+        # Chapters are written concurrently, so each one gets an overview of the chapters
+        # just before it (name + description) rather than their generated text.
+        # The semaphore is created per run since it binds to the running event loop.
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
 
-        # Create a complete list of all chapters
-        all_chapters = []
-        chapter_filenames = {}  # Store chapter filename mapping for linking
-        for i, abstraction_index in enumerate(chapter_order):
-            if 0 <= abstraction_index < len(abstractions):
-                chapter_num = i + 1
-                chapter_name = abstractions[abstraction_index][
-                    "name"
-                ]  # Potentially translated name
-                # Create safe filename (from potentially translated name)
-                safe_name = "".join(
-                    c if c.isalnum() else "_" for c in chapter_name
-                ).lower()
-                filename = f"{i+1:02d}_{safe_name}.md"
-                # Format with link (using potentially translated name)
-                all_chapters.append(f"{chapter_num}. [{chapter_name}]({filename})")
-                # Store mapping of chapter index to filename for linking
-                chapter_filenames[abstraction_index] = {
-                    "num": chapter_num,
-                    "name": chapter_name,
-                    "filename": filename,
-                }
+        # Chapter filename mapping for linking (shared with the index page)
+        chapter_filenames = get_chapter_filenames(shared)
+
+        # Create a formatted string with all chapters (using potentially translated names)
+        full_chapter_listing = "\n".join(
+            f"{chapter['num']}. [{chapter['name']}]({chapter['filename']})"
+            for chapter in chapter_filenames.values()
+        )
 
-        # Create a formatted string with all chapters
-        full_chapter_listing = "\n".join(all_chapters)
+        # Values that are the same for every chapter are kept once on the node (a fresh
+        # copy per run) rather than in each item
+        language = ctx["language"]
+        lang_ctx = get_language_context(language)
+        structure_note = ""
+        language_instruction = ""
+        concept_details_note = ""
+        prev_summary_note = ""
+        if lang_ctx["is_non_english"]:
+            lang_cap = lang_ctx["lang_cap"]
+            structure_note = f" (Note: Chapter names might be in {lang_cap})"
+            concept_details_note = lang_ctx["lang_note"]
+            prev_summary_note = f" (Note: This summary might be in {lang_cap})"
+            language_instruction = f"IMPORTANT: Write this ENTIRE tutorial chapter in **{lang_cap}**. Some input context (like concept name, description, chapter list, previous summary) might already be in {lang_cap}, but you MUST translate ALL other generated content including explanations, examples, technical terms, and potentially code comments into {lang_cap}. DO NOT use English anywhere except in code syntax, required proper nouns, or when specified. The entire output MUST be in {lang_cap}."
+        self._shared_ctx = {
+            "use_cache": ctx["use_cache"],
+            "chapter_filenames": chapter_filenames,  # Chapter filename mapping (uses potentially translated names)
+            "wiki_context": f"""## Wiki Context
+**Project**: `{ctx["project_name"]}`
+
+**Wiki Structure**{structure_note}:
+{full_chapter_listing}""",
+            "language_instruction": language_instruction,
+            "concept_details_note": concept_details_note,
+            "prev_summary_note": prev_summary_note,
+        }
 
         items_to_process = []
+        chapter_summaries = []  # "num. name: description" of the chapters so far
         for i, abstraction_index in enumerate(chapter_order):
             if 0 <= abstraction_index < len(abstractions):
                 abstraction_details = abstractions[
@@ -984,20 +1561,24 @@ class WriteChapters(BatchNode):
                     next_idx = chapter_order[i + 1]
                     next_chapter = chapter_filenames[next_idx]
 
+                # Overview of the chapters just before this one (uses potentially translated
+                # names); the full chapter listing already gives the overall structure
+                previous_chapters_summary = "\n".join(
+                    chapter_summaries[-PREVIOUS_CHAPTERS_WINDOW:]
+                )
+                chapter_summaries.append(
+                    f"{i + 1}. {abstraction_details['name']}: {abstraction_details['description'].strip()}"
+                )
+
                 items_to_process.append(
                     {
                         "chapter_num": i + 1,
                         "abstraction_index": abstraction_index,
                         "abstraction_details": abstraction_details,  # Has potentially translated name/desc
                         "related_files_content_map": related_files_content_map,
-                        "project_name": ctx["project_name"],  # Add project name
-                        "full_chapter_listing": full_chapter_listing,  # Add the full chapter listing (uses potentially translated names)
-                        "chapter_filenames": chapter_filenames,  # Add chapter filenames mapping (uses potentially translated names)
                         "prev_chapter": prev_chapter,  # Add previous chapter info (uses potentially translated name)
                         "next_chapter": next_chapter,  # Add next chapter info (uses potentially translated name)
-                        "language": ctx["language"],  # Add language for multi-language support
-                        "use_cache": ctx["use_cache"], # Pass use_cache flag
-                        # previous_chapters_summary will be added dynamically in exec
+                        "previous_chapters_summary": previous_chapters_summary,  # Overview of earlier chapters
                     }
                 )
             else:
@@ -1006,10 +1587,85 @@ class WriteChapters(BatchNode):
                 )
 
         print(f"Preparing to write {len(items_to_process)} wiki articles...")
-        return items_to_process  # Iterable for BatchNode
+        # Group consecutive chapters so each LLM request writes up to batch_size of them
+        return [
+            items_to_process[i : i + self.batch_size]
+            for i in range(0, len(items_to_process), self.batch_size)
+        ]  # Iterable for AsyncParallelBatchNode
+
+    async def exec_attempt_async(self, group, attempt):
+        # This runs concurrently for each group prepared above
+        async with self.semaphore:
+            return await asyncio.to_thread(self._write_chapters, group, attempt)
+
+    def _write_chapters(self, group, attempt=0):
+        if len(group) == 1:
+            return [self._write_chapter(group[0], attempt)]
+
+        first, last = group[0]["chapter_num"], group[-1]["chapter_num"]
+        print(f"Writing wiki articles {first}-{last} in a single LLM request...")
+        # The wiki context and language are run-wide, so they are given once for the group
+        chapter_specs = "\n\n".join(
+            f"<<<CHAPTER {item['chapter_num']}>>>\n{self._build_chapter_context(item)}"
+            for item in group
+        )
+        prompt = f"""
+{self._shared_ctx["wiki_context"]}
+
+Write the following {len(group)} wiki articles. Each article is a complete, standalone article that follows all of the requirements above for its own Article Subject.
+Start each article with its delimiter line exactly as given (e.g. `<<<CHAPTER {first}>>>`) on its own line, followed by the article's Markdown. Do not add anything else between articles.
+
+{chapter_specs}
+
+{self._shared_ctx["language_instruction"]}""".rstrip()
+        use_cache = self._shared_ctx["use_cache"] and attempt == 0  # Use cache only if not retrying
+        # Cached only if it splits, so a truncated response isn't replayed on later runs
+        response = call_llm(
+            prompt,
+            use_cache=use_cache,
+            system_prompt=WRITE_CHAPTER_PREFIX,
+            validate=lambda text: self._split_chapters(group, text) is not None,
+        )
+
+        # A missing or extra section means the response was truncated or malformed, so
+        # fall back to one request per chapter
+        sections = self._split_chapters(group, response)
+        if sections is None:
+            print(f"Warning: Could not split response for articles {first}-{last}. Writing them one by one.")
+            return [self._write_chapter(item, attempt) for item in group]
+
+        return [
+            self._fix_chapter_heading(item, section)
+            for item, section in zip(group, sections)
+        ]
+
+    @staticmethod
+    def _split_chapters(group, response):
+        """The group's articles from a grouped response, in order, or None if it doesn't split."""
+        parts = CHAPTER_DELIMITER_PATTERN.split(response)
+        sections = dict(zip(parts[1::2], parts[2::2]))
+        expected = [str(item["chapter_num"]) for item in group]
+        if sorted(sections, key=int) != expected or not all(sections[n].strip() for n in expected):
+            return None
+        return [sections[n].strip() for n in expected]
+
+    def _write_chapter(self, item, attempt=0):
+        chapter_num = item["chapter_num"]
+        abstraction_name = item["abstraction_details"]["name"]
+        use_cache = self._shared_ctx["use_cache"] and attempt == 0  # Use cache only if not retrying
+        print(f"Writing wiki article {chapter_num} for: {abstraction_name} using LLM...")
+        # Static instructions are the system prompt; run-wide context comes next and the
+        # language instruction last, so the shared leading bytes can be cached by the provider
+        prompt = f"""
+{self._shared_ctx["wiki_context"]}
+
+{self._build_chapter_context(item)}
 
-    def exec(self, item):
-        # This runs for each item prepared above
+{self._shared_ctx["language_instruction"]}""".rstrip()
+        chapter_content = call_llm(prompt, use_cache=use_cache, system_prompt=WRITE_CHAPTER_PREFIX)
+        return self._fix_chapter_heading(item, chapter_content)
+
+    def _build_chapter_context(self, item):
         abstraction_name = item["abstraction_details"][
             "name"
         ]  # Potentially translated name
@@ -1017,164 +1673,72 @@ class WriteChapters(BatchNode):
             "description"
         ]  # Potentially translated description
         chapter_num = item["chapter_num"]
-        project_name = item.get("project_name")
-        language = item.get("language", "english")
-        use_cache = item.get("use_cache", True) # Read use_cache from item
-        print(f"Writing wiki article {chapter_num} for: {abstraction_name} using LLM...")
 
-        # Prepare file context string from the map
+        # Prepare file context string from the map (keys are the file labels)
         file_context_str = "\n\n".join(
-            f"--- File: {idx_path.split('# ')[1] if '# ' in idx_path else idx_path} ---\n{content}"
-            for idx_path, content in item["related_files_content_map"].items()
+            f"{label}\n{content}"
+            for label, content in item["related_files_content_map"].items()
         )
 
-        # Get summary of chapters written *before* this one
-        # Use the temporary instance variable
-        previous_chapters_summary = "\n---\n".join(self.chapters_written_so_far)
-
-        # Add language instruction and context notes only if not English
-        language_instruction = ""
-        concept_details_note = ""
-        structure_note = ""
-        prev_summary_note = ""
-        instruction_lang_note = ""
-        mermaid_lang_note = ""
-        code_comment_note = ""
-        link_lang_note = ""
-        tone_note = ""
-        if language.lower() != "english":
-            lang_cap = language.capitalize()
-            language_instruction = f"IMPORTANT: Write this ENTIRE tutorial chapter in **{lang_cap}**. Some input context (like concept name, description, chapter list, previous summary) might already be in {lang_cap}, but you MUST translate ALL other generated content including explanations, examples, technical terms, and potentially code comments into {lang_cap}. DO NOT use English anywhere except in code syntax, required proper nouns, or when specified. The entire output MUST be in {lang_cap}.\n\n"
-            concept_details_note = f" (Note: Provided in {lang_cap})"
-            structure_note = f" (Note: Chapter names might be in {lang_cap})"
-            prev_summary_note = f" (Note: This summary might be in {lang_cap})"
-            instruction_lang_note = f" (in {lang_cap})"
-            mermaid_lang_note = f" (Use {lang_cap} for labels/text if appropriate)"
-            code_comment_note = f" (Translate to {lang_cap} if possible, otherwise keep minimal English for clarity)"
-            link_lang_note = (
-                f" (Use the {lang_cap} chapter title from the structure above)"
-            )
-            tone_note = f" (appropriate for {lang_cap} readers)"
-
-        prompt = f"""
-## Role and Task
-You are an expert software architect and technical documentation specialist. Your task is to write a comprehensive wiki article about "{abstraction_name}" for the `{project_name}` codebase repository.
-
-## Critical Requirements
-{STRICT_ACCURACY_REQUIREMENTS}
-
-**IMPORTANT**: Base your article content ONLY on the actual code and context provided. Do NOT:
-- Reference external libraries, frameworks, or tools not shown in the provided code
-- Create fictional URLs, documentation links, or external resources
-- Mention design patterns or concepts not clearly evident in the code
-- Add code examples that don't exist in the provided context
-- Reference files, functions, or classes not present in the code snippets
-- Create hypothetical scenarios or use cases not supported by the actual code
-- Repeat detailed explanations already covered in other wiki articles
-- Over-explain concepts that are peripheral to this component's core functionality
-
-**IMPORTANT**: Focus on:
-- Architectural purpose and design rationale
-- How this component solves specific problems in the system
-- Avoid repeating explanations from other articles
+        # Overview of chapters that come *before* this one
+        previous_chapters_summary = item["previous_chapters_summary"]
 
-{PROFESSIONAL_TONE_GUIDELINES}
+        # Context notes are empty for English
+        concept_details_note = self._shared_ctx["concept_details_note"]
+        prev_summary_note = self._shared_ctx["prev_summary_note"]
 
-{language_instruction}## Context
-**Project**: `{project_name}`
+        return f"""## Context
 **Article Subject**: {abstraction_name}
 **Article Number**: {chapter_num}
+**Article Title**: `# {abstraction_name}`
 
 **Component Overview**{concept_details_note}:
 {abstraction_description}
 
-**Wiki Structure**{structure_note}:
-{item["full_chapter_listing"]}
-
 **Related Articles Context**{prev_summary_note}:
 {previous_chapters_summary if previous_chapters_summary else "This is the first article in the wiki - no related context yet."}
 
 **Code Context** (Use ONLY this code in your explanations):
-{file_context_str if file_context_str else "No specific code snippets provided for this abstraction."}
-
-## Wiki Article Structure Requirements
-Your article must include:
-
-1. **Article Title**: `# {abstraction_name}`
-2. **Overview**: 
-   - Concise explanation of the component's purpose
-   - Why this component exists and what problem it solves
-
-3. **Architecture**: 
-   - Design decisions and architectural patterns used
-   - Brief description of the component's design and structure
-
-4. **Role in System**: 
-   - How this component fits into the overall system design
-   - Primary usage scenarios within the system
-
-5. **Key Components**:
-   - Essential classes, functions, and methods
-   - Primary functions and responsibilities
-
-6. **Relationships and Interactions**:
-   - Direct connections to other components
-   - How it connects to and collaborates with other components
-
-7. **Design Rationale**:
-   - Why it was designed this way
-   - Critical implementation specifics
-
-8. **Implementation Technical Details**: 
-   - Focused walkthrough of key code elements
-   - Critical implementation specifics only
-
-9. **See Also**: 
-   - References to related wiki articles (if applicable)
-
-
-**Content Guidelines**:
-- Keep each section focused and proportional to the component's actual importance
-- Focus on what makes this component architecturally significant, not general programming concepts
-
-## Code Presentation Rules (if applicable)
-- Keep code blocks under 20 lines
-- Only show code that exists in the provided context
-- Add minimal comments only when they clarify complex logic
-- Break long code into logical segments with explanations
-- Use proper syntax highlighting
+{file_context_str if file_context_str else "No specific code snippets provided for this abstraction."}"""
 
-## Output Format
-Provide ONLY the Markdown content (no code fences around the entire output).
-**Remember**: Every code example, function reference, and technical detail must be based on the actual code provided in the context above."""
-        chapter_content = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0)) # Use cache only if enabled and not retrying
+    def _fix_chapter_heading(self, item, chapter_content):
+        abstraction_name = item["abstraction_details"]["name"]  # Potentially translated name
         # Basic validation/cleanup
         actual_heading = f"# {abstraction_name}"  # Use potentially translated name
-        if not chapter_content.strip().startswith(f"# {abstraction_name}"):
+        stripped_content = chapter_content.strip()
+        # Failure messages stay as returned so CombineTutorial can recognise them
+        if not stripped_content.startswith(actual_heading) and not is_llm_failure(chapter_content):
             # Add heading if missing or incorrect, trying to preserve content
-            lines = chapter_content.strip().split("\n")
-            if lines and lines[0].strip().startswith(
-                "#"
-            ):  # If there's some heading, replace it
-                lines[0] = actual_heading
-                chapter_content = "\n".join(lines)
+            if stripped_content.startswith("#"):  # If there's some heading, replace it
+                # Only the first line is touched, the rest of the article is kept as is
+                _, newline, rest = stripped_content.partition("\n")
+                chapter_content = f"{actual_heading}{newline}{rest}"
             else:  # Otherwise, prepend it
                 chapter_content = f"{actual_heading}\n\n{chapter_content}"
 
-        # Add the generated content to our temporary list for the next iteration's context
-        self.chapters_written_so_far.append(chapter_content)
-
         return chapter_content  # Return the Markdown string (potentially translated)
 
-    def post(self, shared, prep_res, exec_res_list):
-        # exec_res_list contains the generated Markdown for each wiki article, in order
-        shared["chapters"] = exec_res_list
-        # Clean up the temporary instance variable
-        del self.chapters_written_so_far
-        print(f"Finished writing {len(exec_res_list)} wiki articles.")
+    async def post_async(self, shared, prep_res, exec_res_list):
+        # exec_res_list contains one list of Markdown articles per group, in order
+        shared["chapters"] = [chapter for group in exec_res_list for chapter in group]
+        print(f"Finished writing {len(shared['chapters'])} wiki articles.")
+        # Chapters are the last consumer of source file contents. Later nodes only need the
+        # paths (directory tree, file stats) and the documentation files, so release the rest.
+        shared["files"] = [
+            (path, content if is_project_context_file(path) else "")
+            for path, content in shared["files"]
+        ]
 
 
-class WriteBeginnerFriendlyEpisode(Node):
+def distill_chapter(chapter_content, use_cache=True):
+    """Short summary of one wiki article. Raises ValueError if the LLM call fails."""
+    summary = call_llm(chapter_content, use_cache=use_cache, system_prompt=CHAPTER_DISTILL_PREFIX)
+    if not summary or is_llm_failure(summary):
+        raise ValueError(f"Could not distill wiki article: {summary!r}")
+    return summary.strip()
+
+
+class WriteBeginnerFriendlyEpisode(RetryNode):
     def prep(self, shared):
         ctx = get_common_context(shared)
         abstractions = shared["abstractions"]
@@ -1184,9 +1748,6 @@ class WriteBeginnerFriendlyEpisode(Node):
         language = ctx["language"]
         use_cache = ctx["use_cache"]
 
-        # Combine wiki chapters into a single string for context
-        combined_wiki_content = "\n\n".join(chapters)
-
         # Prepare context for the LLM
         abstractions_overview = "\n".join([
             f"- {abstr['name']}: {abstr['description']}"
@@ -1208,10 +1769,7 @@ Project Summary{summary_note}: {relationships["summary"]}
 {abstractions_overview}
 
 ## Key Relationships (for your understanding)
-{relationships["details"]}
-
-## Detailed Wiki Content (Generated Chapters)
-{combined_wiki_content}
+{json.dumps(relationships["details"], ensure_ascii=False, separators=(",", ":"))}
 """
         return (
             context,
@@ -1233,76 +1791,43 @@ Project Summary{summary_note}: {relationships["summary"]}
             relationships,
             chapters
         ) = prep_res
+
+        # The episode is written from short summaries of the chapters rather than their full
+        # text. They are requested here so a failed summary retries the node; on the last
+        # attempt a chapter whose summary still fails is used in full instead
+        last_attempt = self.cur_retry == self.max_retries - 1
+
+        def summarize(chapter):
+            try:
+                return distill_chapter(chapter, use_cache)
+            except ValueError:
+                if not last_attempt:
+                    raise
+                return chapter
+
+        print(f"Distilling {len(chapters)} wiki articles for the beginner-friendly episode...")
+        with ThreadPoolExecutor(max_workers=max(1, min(CHAPTER_DISTILL_WORKERS, len(chapters)))) as executor:
+            chapter_summaries = list(executor.map(summarize, chapters))
+        combined_wiki_content = "\n\n".join(chapter_summaries)
+
         print(f"Generating beginner-friendly episode for {project_name}...")
 
         # Add language instructions and hints if not English
         language_instruction = ""
         if language.lower() != "english":
             lang_cap = language.capitalize()
-            language_instruction = f"IMPORTANT: Write this ENTIRE beginner-friendly episode in **{lang_cap}**. Do NOT use English anywhere except required proper nouns.\n\n"
+            language_instruction = f"IMPORTANT: Write this ENTIRE beginner-friendly episode in **{lang_cap}**. Do NOT use English anywhere except required proper nouns."
 
         prompt = f"""
-{language_instruction}## Role and Task
-You are an expert technical writer and educator. Your task is to transform a detailed technical wiki about a software project into a beginner-friendly overview document. This document should be easy for a non-technical person to understand while still conveying accurate information about the system and its concepts.
-
-## Critical Requirements
-{STRICT_ACCURACY_REQUIREMENTS}
-
-The document should prioritize clarity, relevance, and accessibility. The primary goal is to describe what the project does, relationships between modules and parts of the codebase, presenting complex technical concepts and terms in a way that an average non-technical person can understand. The document should be beginner-friendly, precise, and approachable, without oversimplifying the underlying concepts.
-
-## Suggested Document Structure (Adapt as needed)
-Note: This structure is purely suggestive and should not be followed rigidly. Combine sections or adapt as necessary to best explain *this specific project*.
-
-1.  **Introduction**
-    *   Project overview
-    *   Core purpose
-    *   System's primary objectives
-
-2.  **System Architecture**
-    *   High-level system diagram (conceptual, using mermaid)
-    *   Key components
-    *   Component interactions
-
-3.  **Module Breakdown**
-    *   Core modules
-    *   Module responsibilities
-    *   Functional interactions
-
-4.  **Key Concepts**
-    *   Fundamental technical concepts
-    *   Simplified explanations
-    *   Conceptual relationships
-
-5.  **Workflow and Data Flow**
-    *   System operation process
-    *   Data transformation steps
-    *   Key processing logic
-
-6.  **Technical Foundations**
-    *   Primary design principles
-    *   Critical implementation strategies
-    *   Core algorithmic approaches
-
-7.  **Glossary**
-    *   Essential technical terms
-    *   Plain language definitions
-
 ## Context
 Project Name: {project_name}
 
 {context}
+## Wiki Article Summaries (Generated Chapters)
+{combined_wiki_content}
 
-{OUTPUT_FORMAT_INSTRUCTIONS}
-- Make technical explanations **accessible to a non-technical audience**.
-- Use analogies, and examples to explain complex concepts if necessary
-- Avoid jargon where possible, or explain it clearly.
-- Focus on the "what" and "why" from a user perspective.
-- Be concise
-- Don't overuse lists, prefer paragraphs
-
-Provide ONLY the Markdown content for the episode (no code fences around the entire output).
-"""
-        episode_content = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0))
+{language_instruction}"""
+        episode_content = call_llm(prompt, use_cache=(use_cache and self.cur_retry == 0), system_prompt=BEGINNER_EPISODE_PREFIX)
         print(f"Generated beginner-friendly episode for {project_name}.")
         return episode_content
 
@@ -1310,34 +1835,127 @@ Provide ONLY the Markdown content for the episode (no code fences around the ent
         shared["beginner_friendly_episode"] = exec_res # Store the Markdown content
 
 
-class CombineTutorial(Node):
+# Config files listed on the index page: exact (lowercased) filenames, and substrings
+# that also match variants such as dev-requirements.txt, Dockerfile.prod or .env.local
+CONFIG_FILENAMES = frozenset((
+    "package.json", "cargo.toml", "go.mod", "pom.xml", "build.gradle", "composer.json", "gemfile",
+))
+CONFIG_FILENAME_MARKERS = ("requirements.txt", "dockerfile", "docker-compose", "config", "settings", ".env")
+
+
+# License detection for the index page metadata: an SPDX identifier if the file declares
+# one, otherwise the first license whose (uppercase) phrases all appear in the header
+SPDX_LICENSE_PATTERN = re.compile(r"SPDX-License-Identifier:\s*([\w.+-]+)", re.IGNORECASE)
+LICENSE_SIGNATURES = (
+    ("MIT License", ("PERMISSION IS HEREBY GRANTED", "MIT")),
+    ("Apache License 2.0", ("APACHE LICENSE", "VERSION 2.0")),
+    ("GNU GPL v3.0", ("GNU GENERAL PUBLIC LICENSE", "VERSION 3")),
+    ("GNU GPL v2.0", ("GNU GENERAL PUBLIC LICENSE", "VERSION 2")),
+    ("BSD 3-Clause License", ("BSD", "REDISTRIBUTION AND USE", "3 CLAUSE")),
+    ("BSD 2-Clause License", ("BSD", "REDISTRIBUTION AND USE", "2 CLAUSE")),
+    ("ISC License", ("ISC LICENSE",)),
+    ("Mozilla Public License 2.0", ("MOZILLA PUBLIC LICENSE", "VERSION 2.0")),
+    ("GNU LGPL v3.0", ("GNU LESSER GENERAL PUBLIC LICENSE", "VERSION 3")),
+    ("GNU LGPL v2.1", ("GNU LESSER GENERAL PUBLIC LICENSE", "VERSION 2.1")),
+    ("The Unlicense", ("THIS IS FREE AND UNENCUMBERED SOFTWARE",)),
+    ("Creative Commons", ("CREATIVE COMMONS",)),
+)
+# How much of a license file is searched
+LICENSE_HEADER_CHARS = 4096
+# Fallback license name: the first short line with an indicator that is not boilerplate
+LICENSE_BOILERPLATE_MARKERS = (
+    "COPYRIGHT (C)", "ALL RIGHTS RESERVED", "THE SOFTWARE IS PROVIDED",
+    "WITHOUT WARRANTY", "IN NO EVENT SHALL", "LIABILITY",
+)
+LICENSE_LINE_MARKERS = ("LICENSE", "LICENCE", "TERMS", "PERMISSION", "REDISTRIBUTION")
+
+# Sanitizes Mermaid node and edge labels in one pass: quotes would end the label and
+# line breaks would end the statement
+MERMAID_LABEL_TRANSLATION = str.maketrans({'"': None, "\n": " ", "\r": " "})
+
+
+class CombineTutorial(RetryNode):
     def prep(self, shared):
         ctx = get_common_context(shared)
         output_base_dir = shared.get("output_dir", "output")  # Default output dir
         output_path = os.path.join(output_base_dir, ctx["project_name"])
+
+        # Get potentially translated data
+        chapter_order = shared["chapter_order"]  # indices
+        abstractions = shared[
+            "abstractions"
+        ]  # list of dicts -> name/description potentially translated
+        chapters_content = shared[
+            "chapters"
+        ]  # list of strings -> content potentially translated
+        beginner_friendly_episode = shared.get("beginner_friendly_episode", "")
+
+        index_inputs = self._collect_index_inputs(shared, len(chapters_content))
+
+        # Pair each chapter link (same order and filter) with its content
+        chapter_files = []
+        for i, abstraction_index in enumerate(chapter_order):
+            # Ensure index is valid and we have content for it
+            if 0 <= abstraction_index < len(abstractions) and i < len(chapters_content):
+                chapter_files.append({
+                    "filename": index_inputs["chapter_links"][len(chapter_files)]["filename"],
+                    "content": chapters_content[i],
+                })
+
+        # --- Generate comprehensive index content using LLM ---
+        # Reuse the index PrefetchIndex started while chapters were being written, unless
+        # its inputs no longer match (e.g. a chapter is missing)
+        index_future = shared.pop("index_future", None)
+        prefetched_inputs = shared.pop("index_inputs", None)
+        if shared.get("index_content"):
+            # Restored by TutorialCache
+            index_content = shared["index_content"]
+        elif index_future is not None and self._same_index_inputs(prefetched_inputs, index_inputs):
+            index_content = index_future.result()
+        else:
+            if index_future is not None:
+                print("Prefetched index is out of date, regenerating it...")
+                index_future.cancel()
+            index_content = self._generate_comprehensive_index(shared=shared, **index_inputs)
+
+        return {
+            "output_path": output_path,
+            "index_content": index_content,
+            "chapter_files": chapter_files,  # List of {"filename": str, "content": str}
+            "beginner_friendly_episode": beginner_friendly_episode, # NEW: Pass the beginner-friendly content
+        }
+
+    @staticmethod
+    def _same_index_inputs(a, b):
+        # The generation date is taken when the inputs are collected, so it is not compared
+        ignore = ("metadata",)
+        return {k: v for k, v in a.items() if k not in ignore} == {
+            k: v for k, v in b.items() if k not in ignore
+        }
+
+    def _collect_index_inputs(self, shared, num_chapters):
+        """Gather the index page inputs, assuming the first num_chapters chapters have content."""
+        ctx = get_common_context(shared)
         repo_url = shared.get("repo_url")  # Get the repository URL
         
-        # Detect repository type and extract documentation context for better categorization
+        # Detect repository type for better categorization
         repo_type = detect_repository_type(ctx["files_data"], shared)
-        doc_context = extract_documentation_context(ctx["files_data"])
         
         # Extract README.md, license, and other contextual information
-        readme_content = ""
-        license_content = ""
         license_info = {}
-        project_context = ""
+        project_context_parts = []
         
         for path, content in ctx["files_data"]:
-            filename = path.lower().split('/')[-1]
+            # Classify on the lowercased filename, computed once per file
+            filename = path.rpartition('/')[2].lower()
             if 'readme' in filename:
-                readme_content = content
-                project_context += f"\n\n=== README.md Content ===\n{content}"
-            elif 'license' in filename or filename in ['copying', 'copyright']:
-                license_content = content
+                project_context_parts.append(f"\n\n=== README.md Content ===\n{content}")
+            elif 'license' in filename or filename in LICENSE_FILENAMES:
                 license_info = self._extract_license_info(path, content)
-                project_context += f"\n\n=== License File ({path}) ===\n{content}"
-            elif any(ctx_file in filename for ctx_file in ['doc', 'guide', 'overview', 'architecture']):
-                project_context += f"\n\n=== {path} ===\n{content}"
+                project_context_parts.append(f"\n\n=== License File ({path}) ===\n{content}")
+            elif CONTEXTUAL_FILE_PATTERN.search(filename):
+                project_context_parts.append(f"\n\n=== {path} ===\n{content}")
+        project_context = "".join(project_context_parts)
         
         # Collect metadata for index generation
         from datetime import datetime
@@ -1371,10 +1989,6 @@ class CombineTutorial(Node):
         abstractions = shared[
             "abstractions"
         ]  # list of dicts -> name/description potentially translated
-        chapters_content = shared[
-            "chapters"
-        ]  # list of strings -> content potentially translated
-        beginner_friendly_episode = shared.get("beginner_friendly_episode", "")
 
         # --- Generate Mermaid Diagram ---
         mermaid_lines = ["flowchart TD"]
@@ -1382,7 +1996,7 @@ class CombineTutorial(Node):
         for i, abstr in enumerate(abstractions):
             node_id = f"A{i}"
             # Use potentially translated name, sanitize for Mermaid ID and label
-            sanitized_name = abstr["name"].replace('"', "")
+            sanitized_name = abstr["name"].translate(MERMAID_LABEL_TRANSLATION)
             node_label = sanitized_name  # Using sanitized name only
             mermaid_lines.append(
                 f'    {node_id}["{node_label}"]'
@@ -1392,9 +2006,7 @@ class CombineTutorial(Node):
             from_node_id = f"A{rel['from']}"
             to_node_id = f"A{rel['to']}"
             # Use potentially translated label, sanitize
-            edge_label = (
-                rel["label"].replace('"', "").replace("\n", " ")
-            )  # Basic sanitization
+            edge_label = rel["label"].translate(MERMAID_LABEL_TRANSLATION)  # Basic sanitization
             max_label_len = 30
             if len(edge_label) > max_label_len:
                 edge_label = edge_label[: max_label_len - 3] + "..."
@@ -1406,32 +2018,23 @@ class CombineTutorial(Node):
         # --- End Mermaid ---
 
         # Prepare chapter information for the comprehensive index
-        chapter_files = []
         chapter_links = []
         
-        # Generate chapter files and links based on the determined order
+        chapter_filenames = get_chapter_filenames(shared)
+
+        # Generate chapter links based on the determined order
         for i, abstraction_index in enumerate(chapter_order):
             # Ensure index is valid and we have content for it
-            if 0 <= abstraction_index < len(abstractions) and i < len(chapters_content):
-                abstraction_name = abstractions[abstraction_index][
-                    "name"
-                ]  # Potentially translated name
-                # Sanitize potentially translated name for filename
-                safe_name = "".join(
-                    c if c.isalnum() else "_" for c in abstraction_name
-                ).lower()
-                filename = f"{i+1:02d}_{safe_name}.md"
-                
+            if 0 <= abstraction_index < len(abstractions) and i < num_chapters:
+                chapter = chapter_filenames[abstraction_index]  # Potentially translated name
+
                 # Store chapter link info
                 chapter_links.append({
-                    "number": i + 1,
-                    "title": abstraction_name,
-                    "filename": filename,
+                    "number": chapter["num"],
+                    "title": chapter["name"],
+                    "filename": chapter["filename"],
                     "description": abstractions[abstraction_index]["description"]
                 })
-                
-                # Store filename and corresponding content
-                chapter_files.append({"filename": filename, "content": chapters_content[i]})
             else:
                 print(
                     f"Warning: Mismatch between chapter order, abstractions, or content at index {i} (abstraction index {abstraction_index}). Skipping file generation for this entry."
@@ -1447,16 +2050,16 @@ class CombineTutorial(Node):
             "description": "A high-level, simplified overview of the project for non-technical readers."
         })
 
-        # --- Generate comprehensive index content using LLM ---
-        index_content = self._generate_comprehensive_index(
-            ctx["project_name"], relationships_data, abstractions, repo_url, mermaid_diagram, chapter_links, shared, project_context, metadata, repo_type, beginner_friendly_episode
-        )
-
         return {
-            "output_path": output_path,
-            "index_content": index_content,
-            "chapter_files": chapter_files,  # List of {"filename": str, "content": str}
-            "beginner_friendly_episode": beginner_friendly_episode, # NEW: Pass the beginner-friendly content
+            "project_name": ctx["project_name"],
+            "relationships_data": relationships_data,
+            "abstractions": abstractions,
+            "repo_url": repo_url,
+            "mermaid_diagram": mermaid_diagram,
+            "chapter_links": chapter_links,
+            "project_context": project_context,
+            "metadata": metadata,
+            "repo_type": repo_type,
         }
 
     def _generate_comprehensive_index(self, project_name, relationships_data, abstractions, repo_url, mermaid_diagram, chapter_links, shared, project_context="", metadata=None, repo_type="mixed", beginner_friendly_episode_content=""):
@@ -1471,11 +2074,11 @@ class CombineTutorial(Node):
             for abstr in abstractions
         ])
         
-        # Create simple directory tree for LLM analysis
-        directory_tree = self._create_directory_tree(files_info)
+        # Simple directory tree for LLM analysis (built by FetchRepo)
+        directory_tree = shared.get("directory_tree") or self._create_directory_tree(files_info)
         
-        # Analyze file extensions for basic tech stack info
-        file_extensions = {}
+        # Analyze file extensions for basic tech stack info and find config files in one pass
+        file_extensions = Counter()
         config_files = []
         
         for file_info in files_info:
@@ -1484,22 +2087,18 @@ class CombineTutorial(Node):
                 path = file_info[0]
             else:
                 continue  # Skip malformed entries
-                
-            if "." in path:
-                ext = path.split(".")[-1].lower()
-                file_extensions[ext] = file_extensions.get(ext, 0) + 1
+
+            # Lowercased filename, computed once for both checks
+            filename = path.rpartition("/")[2].lower()
+            if "." in filename:
+                file_extensions[filename.rpartition(".")[2]] += 1
             
             # Identify config files
-            filename = path.split("/")[-1].lower()
-            if any(config_name in filename for config_name in [
-                "package.json", "requirements.txt", "cargo.toml", "go.mod",
-                "pom.xml", "build.gradle", "composer.json", "gemfile",
-                "dockerfile", "docker-compose", "config", "settings", ".env"
-            ]):
+            if filename in CONFIG_FILENAMES or any(marker in filename for marker in CONFIG_FILENAME_MARKERS):
                 config_files.append(path)
         
         tech_stack_context = "\n".join([
-            f"- {ext}: {count} files" for ext, count in sorted(file_extensions.items(), key=lambda x: x[1], reverse=True)[:10]
+            f"- {ext}: {count} files" for ext, count in file_extensions.most_common(10)
         ])
         
         config_files_context = "\n".join([f"- {cf}" for cf in config_files[:10]])
@@ -1623,7 +2222,7 @@ Create a concise, well-structured index page that serves as the entry point for
 2. **📊 Generation Metadata** - Include the generation metadata provided above (generation date, repository, commit info, license, etc.)
 3. **🎯 What This Project Does** - Clear value proposition and primary functionality
 4. **📁 Repository Structure** - This is a **{repo_type.title()}** repository. Analyze the directory structure focusing on:
-   {'- Multiple distinct functional areas and how they are organized across packages/modules\n   - Key services or applications and their separation of concerns\n   - Shared libraries and common utilities' if repo_type == 'monorepo' else '- Public API structure and main entry points\n   - Core library organization and module hierarchy\n   - Distribution and packaging approach' if repo_type == 'library' else '- Application entry points and main execution flow\n   - Business logic organization and feature structure\n   - Configuration and deployment setup' if repo_type == 'application' else '- Extensibility mechanisms and plugin architecture\n   - CLI interfaces and developer tools\n   - Core processing engines and framework components' if repo_type == 'framework' else '- Content organization and documentation structure\n   - Example code and tutorial progression\n   - Publishing and generation workflows' if repo_type == 'documentation' else '- Infrastructure components and deployment configurations\n   - Automation systems and CI/CD pipelines\n   - Environment management and orchestration' if repo_type == 'infrastructure' else '- Primary purpose and main organizational patterns\n   - Key functional areas and their relationships\n   - Overall architecture and design approach'}
+   {INDEX_REPO_TYPE_GUIDANCE.get(repo_type, INDEX_REPO_TYPE_GUIDANCE['mixed'])}
    
    Provide key insights about the organization and structure without repeating the type classification.
 5. **🏗️ Architecture Overview** - High-level design and key architectural patterns (focus on essential patterns only)
@@ -1657,17 +2256,10 @@ Provide the complete Markdown content for the index page{lang_hint}. Start with
 """
         
         # Generate the comprehensive index using LLM
-        index_content = call_llm(prompt)
+        index_content = call_llm(prompt, use_cache=shared.get("use_cache", True))
         
         # Clean up any potential code fence wrapping
-        if index_content.startswith("```markdown"):
-            index_content = index_content[11:]
-        if index_content.startswith("```"):
-            index_content = index_content[3:]
-        if index_content.endswith("```"):
-            index_content = index_content[:-3]
-        
-        return index_content.strip()
+        return CODE_FENCE_PATTERN.sub("", index_content).strip()
 
     def _create_directory_tree(self, files_info):
         """Create a simple directory tree representation for LLM analysis."""
@@ -1682,32 +2274,20 @@ Provide the complete Markdown content for the index page{lang_hint}. Start with
         if not content or not content.strip():
             return license_info
             
-        content_upper = content.upper()
-        content_lines = content.strip().split('\n')
-        
-        # Common license patterns - more flexible matching
-        license_patterns = {
-            "MIT License": ["MIT LICENSE"],
-            "MIT License": ["PERMISSION IS HEREBY GRANTED", "MIT"],
-            "Apache License 2.0": ["APACHE LICENSE", "VERSION 2.0"],
-            "GNU GPL v3.0": ["GNU GENERAL PUBLIC LICENSE", "VERSION 3"],
-            "GNU GPL v2.0": ["GNU GENERAL PUBLIC LICENSE", "VERSION 2"],
-            "BSD 3-Clause License": ["BSD", "REDISTRIBUTION AND USE", "3 CLAUSE"],
-            "BSD 2-Clause License": ["BSD", "REDISTRIBUTION AND USE", "2 CLAUSE"],
-            "ISC License": ["ISC LICENSE"],
-            "Mozilla Public License 2.0": ["MOZILLA PUBLIC LICENSE", "VERSION 2.0"],
-            "GNU LGPL v3.0": ["GNU LESSER GENERAL PUBLIC LICENSE", "VERSION 3"],
-            "GNU LGPL v2.1": ["GNU LESSER GENERAL PUBLIC LICENSE", "VERSION 2.1"],
-            "The Unlicense": ["THIS IS FREE AND UNENCUMBERED SOFTWARE"],
-            "Creative Commons": ["CREATIVE COMMONS"]
-        }
-        
-        # Check for license patterns
-        detected_license = None
-        for license_name, patterns in license_patterns.items():
-            if all(pattern in content_upper for pattern in patterns):
-                detected_license = license_name
-                break
+        # Only the first 10 lines are used as a fallback name, so don't split the rest
+        content_lines = content.strip().split('\n', 10)[:10]
+
+        # A declared SPDX identifier names the license directly; otherwise look for the
+        # identifying phrases, which are in the license's header
+        header = content[:LICENSE_HEADER_CHARS]
+        spdx_match = SPDX_LICENSE_PATTERN.search(header)
+        detected_license = spdx_match.group(1) if spdx_match else None
+        if detected_license is None:
+            header_upper = header.upper()
+            for license_name, patterns in LICENSE_SIGNATURES:
+                if all(pattern in header_upper for pattern in patterns):
+                    detected_license = license_name
+                    break
         
         # If we detected a specific license, use it
         if detected_license:
@@ -1715,22 +2295,18 @@ Provide the complete Markdown content for the index page{lang_hint}. Start with
         else:
             # Try to extract meaningful license information from the content
             # Look for the first substantial line that might indicate the license
-            for line in content_lines[:10]:  # Check first 10 lines
+            for line in content_lines:
                 line_clean = line.strip()
                 if not line_clean:
                     continue
+                line_upper = line_clean.upper()
                     
                 # Skip common boilerplate
-                if any(skip in line_clean.upper() for skip in [
-                    "COPYRIGHT (C)", "ALL RIGHTS RESERVED", "THE SOFTWARE IS PROVIDED",
-                    "WITHOUT WARRANTY", "IN NO EVENT SHALL", "LIABILITY"
-                ]):
+                if any(skip in line_upper for skip in LICENSE_BOILERPLATE_MARKERS):
                     continue
                     
                 # Look for license-indicating lines
-                if any(indicator in line_clean.upper() for indicator in [
-                    "LICENSE", "LICENCE", "TERMS", "PERMISSION", "REDISTRIBUTION"
-                ]):
+                if any(indicator in line_upper for indicator in LICENSE_LINE_MARKERS):
                     # Clean up the line and use it if it's reasonable length
                     if 10 <= len(line_clean) <= 80:
                         license_info["name"] = line_clean
@@ -1753,31 +2329,64 @@ Provide the complete Markdown content for the index page{lang_hint}. Start with
         # Rely on Node's built-in retry/fallback
         os.makedirs(output_path, exist_ok=True)
 
-        # Watermark text
+        # Watermark text, written after each file's content rather than concatenated to it,
+        # so large articles are not copied just to append one line
         watermark = "\n\nWiki generated by: CoDoC"
 
         # Write index.md
         index_filepath = os.path.join(output_path, "index.md")
         with open(index_filepath, "w", encoding="utf-8") as f:
-            f.write(index_content + watermark)
+            f.write(index_content)
+            f.write(watermark)
         print(f"  - Wrote {index_filepath}")
 
         # Write chapter files
         for chapter_info in chapter_files:
             chapter_filepath = os.path.join(output_path, chapter_info["filename"])
             with open(chapter_filepath, "w", encoding="utf-8") as f:
-                f.write(chapter_info["content"] + watermark)
+                f.write(chapter_info["content"])
+                f.write(watermark)
             print(f"  - Wrote {chapter_filepath}")
         
         # Write beginner-friendly episode
         if beginner_friendly_episode:
             episode_filepath = os.path.join(output_path, "beginner_friendly_episode.md")
             with open(episode_filepath, "w", encoding="utf-8") as f:
-                f.write(beginner_friendly_episode + watermark)
+                f.write(beginner_friendly_episode)
+                f.write(watermark)
             print(f"  - Wrote {episode_filepath}")
 
         return output_path  # Return the final path
 
     def post(self, shared, prep_res, exec_res):
+        shared["index_content"] = prep_res["index_content"]
+        generated = [*shared["chapters"], shared.get("beginner_friendly_episode") or "", shared["index_content"]]
+        if any(is_llm_failure(text) for text in generated):
+            print("Warning: Some LLM calls failed; not caching this tutorial.")
+        elif shared.get("use_cache", True) and not shared.get("tutorial_cache_hit"):
+            save_cached_tutorial(tutorial_cache_key(shared), shared)
         shared["final_output_dir"] = exec_res  # Store the output path
         print(f"\nTutorial generation complete! Files are in: {exec_res}")
+
+
+class PrefetchIndex(CombineTutorial):
+    """
+    Starts the index page LLM call in the background once the chapter order is known.
+    The index only depends on abstractions, relationships and chapter links, so it can be
+    generated while chapters and the beginner-friendly episode are written.
+    CombineTutorial uses the result, or regenerates it if the inputs changed.
+    """
+
+    def prep(self, shared):
+        # Assume every chapter in the order will be written
+        return self._collect_index_inputs(shared, len(shared["chapter_order"]))
+
+    def exec(self, prep_res):
+        print("Starting index page generation in the background...")
+        return prep_res
+
+    def post(self, shared, prep_res, exec_res):
+        shared["index_inputs"] = exec_res
+        shared["index_future"] = BACKGROUND_EXECUTOR.submit(
+            self._generate_comprehensive_index, shared=shared, **exec_res
+        )
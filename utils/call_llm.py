@@ -1,6 +1,10 @@
 import os
 import logging
 import json
+import hashlib
+import sqlite3
+import threading
+import time
 from datetime import datetime
 from openai import OpenAI
 
@@ -17,55 +21,201 @@ file_handler.setFormatter(
 )
 logger.addHandler(file_handler)
 
-def call_llm(prompt: str, use_cache: bool = True) -> str:
+TEMPERATURE = 0.5
+
+# call_llm is invoked from worker threads when chapters are written concurrently
+_cache_lock = threading.Lock()
+# Lookups in the response cache since the process started (calls with use_cache only)
+_cache_stats = {"hits": 0, "misses": 0}
+
+# Response cache: one row per request, so lookups and saves don't touch the other entries
+CACHE_FILE = "llm_cache.sqlite"
+_cache_db = None
+
+# Start of the text call_llm returns instead of a response when the request fails
+LLM_FAILURE_PREFIX = "[OpenAI call failed"
+
+class RateLimiter:
+    """
+    Token-bucket throttle sized to the provider's requests-per-minute and
+    tokens-per-minute limits. Calls wait here until they fit the budget instead
+    of going out, getting a 429 and waiting for a node retry.
+    """
+
+    def __init__(self, rpm: int = 500, tpm: int = 200_000):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60.0)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60.0)
+
+    def time_until_available(self, tokens: int = 0) -> float:
+        """Seconds until one request of the given size fits the budget."""
+        tokens = min(tokens, self.tpm)
+        with self._lock:
+            self._refill()
+            wait_requests = max(0.0, (1 - self._requests) * 60.0 / self.rpm)
+            wait_tokens = max(0.0, (tokens - self._tokens) * 60.0 / self.tpm)
+            return max(wait_requests, wait_tokens)
+
+    def acquire(self, tokens: int = 0):
+        """Blocks until the request fits the budget, then consumes it."""
+        tokens = min(tokens, self.tpm)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+            time.sleep(self.time_until_available(tokens))
+
+rate_limiter = RateLimiter(
+    rpm=int(os.getenv("LLM_RPM", "500")), tpm=int(os.getenv("LLM_TPM", "200000"))
+)
+
+# One client for the whole process, so every node reuses its connection pool
+_client = None
+_client_config = None
+_client_lock = threading.Lock()
+
+def _get_client() -> OpenAI:
+    global _client, _client_config
+    base_url = os.getenv("OPENAI_BASE_URL")
+    api_key = os.getenv("OPENAI_API_KEY", "your-api-key")
+    with _client_lock:
+        # Rebuild only if the endpoint settings changed since the client was created
+        if _client is None or _client_config != (base_url, api_key):
+            if base_url:
+                _client = OpenAI(api_key=api_key, base_url=base_url)
+            else:
+                _client = OpenAI(api_key=api_key)
+            _client_config = (base_url, api_key)
+        return _client
+
+def cache_stats() -> dict:
+    """Response cache hits and misses so far, with the hit rate (0.0-1.0)."""
+    with _cache_lock:
+        hits, misses = _cache_stats["hits"], _cache_stats["misses"]
+    lookups = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / lookups if lookups else 0.0}
+
+def is_llm_failure(response_text: str) -> bool:
+    """True if response_text is call_llm's failure message rather than a model response."""
+    return response_text.startswith(LLM_FAILURE_PREFIX)
+
+def _get_cache_db() -> sqlite3.Connection:
+    """Opens the response cache on first use. Callers hold _cache_lock."""
+    global _cache_db
+    if _cache_db is None:
+        # One connection shared by the worker threads; _cache_lock serializes its use
+        db = sqlite3.connect(CACHE_FILE, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")  # Other processes can read while one writes
+        # Entries of the old llm_cache.json are keyed by the raw prompt rather than a request
+        # hash, so they can never match and are not imported
+        db.execute("CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, response TEXT NOT NULL)")
+        db.commit()
+        _cache_db = db
+    return _cache_db
+
+def _cache_get(cache_key: str):
+    """Cached response for cache_key, or None."""
+    with _cache_lock:
+        try:
+            row = _get_cache_db().execute(
+                "SELECT response FROM cache WHERE key = ?", (cache_key,)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read cache, treating as a miss: {e}")
+            row = None
+        _cache_stats["hits" if row else "misses"] += 1
+    return row[0] if row else None
+
+def _cache_set(cache_key: str, response_text: str):
+    with _cache_lock:
+        try:
+            db = _get_cache_db()
+            db.execute("INSERT OR REPLACE INTO cache VALUES (?, ?)", (cache_key, response_text))
+            db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Failed to save cache: {e}")
+
+def _normalize_for_key(text: str) -> str:
+    """Line endings and trailing whitespace don't change what the model is asked."""
+    return "\n".join(line.rstrip() for line in text.replace("\r\n", "\n").split("\n"))
+
+def _cache_key(model: str, messages: list, temperature: float) -> str:
+    """SHA-256 of the full request, so switching model or settings never returns a stale response."""
+    normalized = [
+        {**message, "content": _normalize_for_key(message["content"])} for message in messages
+    ]
+    request = json.dumps(
+        {"model": model, "messages": normalized, "temperature": temperature}, sort_keys=True
+    )
+    return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+def call_llm(prompt: str, use_cache: bool = True, system_prompt: str = None, validate=None) -> str:
     """
     Calls an OpenAI-compatible LLM endpoint to generate a response to the prompt.
     The base URL can be set via the OPENAI_BASE_URL environment variable.
     API key is read from OPENAI_API_KEY.
-    The function caches responses if use_cache is True.
+    An optional system_prompt is sent first; keeping it byte-identical across calls
+    lets providers reuse their prompt-prefix cache.
+    The function caches responses if use_cache is True, keyed by a hash of the request.
+    If validate is given, only responses for which validate(response) is true are cached.
+    Uncached calls are throttled by rate_limiter (LLM_RPM / LLM_TPM environment variables).
     """
+    if system_prompt:
+        logger.info(f"SYSTEM: {system_prompt}")
     logger.info(f"PROMPT: {prompt}")
 
-    # Simple cache configuration
-    cache_file = "llm_cache.json"
-    cache = {}
-    if use_cache and os.path.exists(cache_file):
-        try:
-            with open(cache_file, "r", encoding="utf-8") as f:
-                cache = json.load(f)
-        except Exception as e:
-            logger.warning(f"Failed to load cache, starting with empty cache: {e}")
-        if prompt in cache:
-            logger.info(f"RESPONSE: {cache[prompt]}")
-            return cache[prompt]
+    model = os.getenv("OPENAI_MODEL", "gemini-2.0-flash-exp")
+    messages = [{"role": "user", "content": prompt}]
+    if system_prompt:
+        messages.insert(0, {"role": "system", "content": system_prompt})
+
+    cache_key = _cache_key(model, messages, TEMPERATURE)
+    if use_cache:
+        cached_response = _cache_get(cache_key)
+        if cached_response is not None:
+            logger.info(f"RESPONSE: {cached_response}")
+            return cached_response
 
+    # Rough prompt size estimate (~4 characters per token)
+    rate_limiter.acquire(sum(len(m["content"]) for m in messages) // 4)
+
+    failed = False
     try:
-        base_url = os.getenv("OPENAI_BASE_URL")
-        api_key = os.getenv("OPENAI_API_KEY", "your-api-key")
-        if base_url:
-            client = OpenAI(api_key=api_key, base_url=base_url)
-        else:
-            client = OpenAI(api_key=api_key)
-        model = os.getenv("OPENAI_MODEL", "gemini-2.0-flash-exp")
+        client = _get_client()
         r = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}],
+            messages=messages,
             response_format={"type": "text"},
-            temperature=0.5,
+            temperature=TEMPERATURE,
+            stream=True,
         )
-        response_text = r.choices[0].message.content
+        # Streamed, so long chapters arrive as they are generated rather than in one response
+        parts = []
+        for chunk in r:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+        response_text = "".join(parts)
     except Exception as e:
         logger.error(f"OpenAI call failed: {e}")
-        response_text = f"[OpenAI call failed: {e}]"
+        response_text = f"{LLM_FAILURE_PREFIX}: {e}]"
+        failed = True
 
     # Save to cache if enabled and successful
-    if use_cache and response_text and not response_text.startswith("["):
-        cache[prompt] = response_text
-        try:
-            with open(cache_file, "w", encoding="utf-8") as f:
-                json.dump(cache, f)
-        except Exception as e:
-            logger.error(f"Failed to save cache: {e}")
+    if use_cache and response_text and not failed and (validate is None or validate(response_text)):
+        _cache_set(cache_key, response_text)
 
 
     return response_text
@@ -0,0 +1,92 @@
+import ast
+import os
+import re
+
+# Source files that get condensed; everything else (docs, configs) is kept verbatim
+PYTHON_EXTENSIONS = {".py", ".pyi"}
+CODE_EXTENSIONS = {
+    ".js", ".jsx", ".ts", ".tsx", ".go", ".java", ".c", ".cc", ".cpp", ".h",
+    ".rs", ".php", ".phtml", ".pyx",
+}
+
+# Declaration lines kept for non-Python source files
+DECLARATION_PATTERN = re.compile(
+    r"^\s*(export\s+)?(default\s+)?(pub(\([^)]*\))?\s+)?(async\s+)?(abstract\s+)?"
+    r"(def|class|function|fn|impl|func|struct|enum|trait|interface|type|module)\b"
+)
+
+
+def _first_line(docstring):
+    return docstring.strip().split("\n")[0] if docstring else ""
+
+
+def _signature(node):
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    return f"{prefix} {node.name}({ast.unparse(node.args)}){returns}"
+
+
+def _condense_python(content):
+    tree = ast.parse(content)
+    lines = []
+    module_doc = ast.get_docstring(tree)
+    if module_doc:
+        lines.append(f'"""{_first_line(module_doc)}"""')
+
+    def visit(body, indent):
+        for node in body:
+            if isinstance(node, ast.ClassDef):
+                bases = ", ".join(ast.unparse(b) for b in node.bases)
+                lines.append(f"{indent}class {node.name}({bases}):" if bases else f"{indent}class {node.name}:")
+                doc = ast.get_docstring(node)
+                if doc:
+                    lines.append(f'{indent}    """{_first_line(doc)}"""')
+                visit(node.body, indent + "    ")
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                lines.append(f"{indent}{_signature(node)}")
+                doc = ast.get_docstring(node)
+                if doc:
+                    lines.append(f'{indent}    """{_first_line(doc)}"""')
+
+    visit(tree.body, "")
+    return "\n".join(lines)
+
+
+def _condense_declarations(content):
+    return "\n".join(
+        line.rstrip() for line in content.split("\n") if DECLARATION_PATTERN.match(line)
+    )
+
+
+def condense_file(path, content):
+    """
+    Reduce a source file to its outline: class/function signatures and the first line
+    of their docstrings for Python, declaration lines for other languages.
+    Non-code files, and files whose outline comes out empty, are returned unchanged.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        if ext in PYTHON_EXTENSIONS:
+            condensed = _condense_python(content)
+        elif ext in CODE_EXTENSIONS:
+            condensed = _condense_declarations(content)
+        else:
+            return content
+    except (SyntaxError, ValueError):
+        # Not parseable as Python (e.g. Python 2 code); fall back to declaration lines
+        condensed = _condense_declarations(content)
+    return condensed if condensed.strip() else content
+
+
+def condense_files(files_data):
+    """Condense a list of (path, content) tuples, keeping order and paths."""
+    return [(path, condense_file(path, content)) for path, content in files_data]
+
+
+if __name__ == "__main__":
+    path = __file__
+    with open(path, "r", encoding="utf-8") as f:
+        original = f.read()
+    condensed = condense_file(path, original)
+    print(condensed)
+    print(f"\n{len(original)} -> {len(condensed)} characters")
@@ -1,20 +1,62 @@
 import os
+import codecs
 import tempfile
 import shutil
-import fnmatch
+import re
 import hashlib
 import git
+from concurrent.futures import ThreadPoolExecutor
 from typing import Union, Set, List, Dict, Tuple, Any
 from urllib.parse import urlparse
+from utils.file_filters import BINARY_EXTENSIONS, BINARY_SIGNATURES, pattern_matcher
 
+# Blobs are read by this many `git cat-file` processes at once; inflating them is CPU bound
+BLOB_READ_WORKERS = min(8, os.cpu_count() or 1)
+# Fewer blobs than this per worker aren't worth starting another process for
+MIN_BLOBS_PER_WORKER = 64
 
-def get_repo_cache_dir(repo_url: str, branch: str = None) -> str:
+# A branch argument that looks like a commit hash is fetched by hash instead of cloned by name
+COMMIT_HASH_PATTERN = re.compile(r"[0-9a-fA-F]{7,40}")
+
+
+def _decode_text(data):
+    """
+    Decodes file bytes as UTF-8 the way a utf-8-sig text-mode read would: without
+    a leading BOM and with universal newlines. Raises UnicodeDecodeError.
     """
-    Generate a deterministic cache directory name based on repository URL and branch.
+    content = data.removeprefix(codecs.BOM_UTF8).decode("utf-8")
+    if "\r" in content:
+        content = content.replace("\r\n", "\n").replace("\r", "\n")
+    return content
+
+
+def _read_blobs(repo_dir, object_ids):
+    """
+    Returns (data, error) for each blob. Opens its own Repo: every Repo talks to one
+    persistent `git cat-file` process, which can't be shared between threads.
+    """
+    repo = git.Repo(repo_dir)
+    try:
+        results = []
+        for object_id in object_ids:
+            try:
+                results.append((repo.odb.stream(bytes.fromhex(object_id)).read(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
+    finally:
+        repo.close()
+
+
+def get_repo_cache_dir(repo_url: str, branch: str = None, subdirectory: str = None) -> str:
+    """
+    Generate a deterministic cache directory name based on repository URL, branch
+    and subdirectory (clones of a subdirectory only check out that subdirectory).
     
     Args:
         repo_url (str): Repository URL
         branch (str, optional): Branch name to include in hash
+        subdirectory (str, optional): Subdirectory to include in hash
         
     Returns:
         str: Path to cache directory
@@ -23,6 +65,8 @@ def get_repo_cache_dir(repo_url: str, branch: str = None) -> str:
     cache_key = repo_url
     if branch:
         cache_key += f"#{branch}"
+    if subdirectory:
+        cache_key += f":{subdirectory}"
     
     # Create hash of the cache key
     repo_hash = hashlib.md5(cache_key.encode()).hexdigest()[:12]
@@ -42,7 +86,8 @@ def crawl_git_repo(
     include_patterns: Union[str, Set[str]] = None,
     exclude_patterns: Union[str, Set[str]] = None,
     branch: str = None,
-    subdirectory: str = None
+    subdirectory: str = None,
+    verbose: bool = False
 ):
     """
     Crawl files from a Git repository by cloning it locally.
@@ -59,8 +104,9 @@ def crawl_git_repo(
         use_relative_paths (bool, optional): If True, file paths will be relative to subdirectory
         include_patterns (str or set of str, optional): Pattern(s) for files to include (e.g., "*.py", {"*.md", "*.txt"})
         exclude_patterns (str or set of str, optional): Pattern(s) for files to exclude
-        branch (str, optional): Specific branch or commit to checkout. If None, uses default branch
+        branch (str, optional): Specific branch, tag or commit to check out. If None, uses default branch
         subdirectory (str, optional): Specific subdirectory within the repo to crawl
+        verbose (bool, optional): Print every added or skipped file instead of only a summary
 
     Returns:
         dict: Dictionary with files and statistics
@@ -83,23 +129,24 @@ def crawl_git_repo(
     if exclude_patterns and isinstance(exclude_patterns, str):
         exclude_patterns = {exclude_patterns}
 
+    # Each pattern set is compiled into a single regex
+    matches_include = pattern_matcher(include_patterns)
+    matches_exclude = pattern_matcher(exclude_patterns)
+
     def should_include_file(file_path: str, file_name: str) -> bool:
         """Determine if a file should be included based on patterns"""
         # If no include patterns are specified, include all files
-        if not include_patterns:
-            include_file = True
-        else:
-            # Check if file matches any include pattern
-            include_file = any(fnmatch.fnmatch(file_name, pattern) for pattern in include_patterns)
+        include_file = matches_include(file_name) if matches_include else True
 
-        # If exclude patterns are specified, check if file should be excluded
-        if exclude_patterns and include_file:
-            # Exclude if file matches any exclude pattern
-            exclude_file = any(fnmatch.fnmatch(file_path, pattern) for pattern in exclude_patterns)
-            return not exclude_file
+        # Exclude if file matches any exclude pattern
+        if matches_exclude and include_file:
+            return not matches_exclude(file_path)
 
         return include_file
 
+    # Without patterns every file is included, so the check is skipped entirely
+    filter_active = bool(matches_include or matches_exclude)
+
     def prepare_repo_url_with_token(repo_url: str, token: str) -> str:
         """Prepare repository URL with authentication token for HTTPS URLs"""
         if not token or repo_url.startswith("git@"):
@@ -120,33 +167,67 @@ def crawl_git_repo(
     skipped_files = []
 
     # Get cache directory for this repository
-    cache_dir = get_repo_cache_dir(repo_url, branch)
+    cache_dir = get_repo_cache_dir(repo_url, branch, subdirectory)
+    is_commit = bool(branch and COMMIT_HASH_PATTERN.fullmatch(branch))
     
     # Check if repository is already cached
     if os.path.exists(cache_dir):
         print(f"Using cached repository at: {cache_dir}")
         repo = git.Repo(cache_dir)
+        # Bring the cached clone up to the remote's latest commit (kept as is when offline).
+        # A commit never moves, so a clone already at the requested one is used as is
+        if not (is_commit and repo.head.commit.hexsha.startswith(branch.lower())):
+            try:
+                repo.git.fetch("--depth=1", clone_url, branch or "HEAD")
+                # Only sparse (subdirectory) clones keep a working tree, see below
+                sparse = repo.git.config("--bool", "core.sparseCheckout", with_exceptions=False) == "true"
+                repo.git.reset("--hard" if sparse else "--soft", "FETCH_HEAD")
+            except git.exc.GitCommandError as e:
+                print(f"Warning: Could not update cached repository, using it as is: {e}")
     else:
         print(f"Cloning repository {repo_url} to cache directory: {cache_dir}")
-        repo = git.Repo.clone_from(clone_url, cache_dir, depth=1)
-    
-    # Checkout specific branch/commit if specified
-    if branch:
+        # Only the requested branch, at its latest commit. Files are read from the object
+        # database, so no working tree is written
+        clone_options = ["--depth=1", "--single-branch", "--no-checkout"]
+        if subdirectory:
+            # Skip all blobs in the clone; the sparse checkout of the subdirectory (plus
+            # top-level files) then downloads just the ones it needs, in one batch
+            clone_options.append("--filter=blob:none")
         try:
-            repo.git.checkout(branch)
-            print(f"Checked out branch/commit: {branch}")
+            # A commit can't be cloned by name; the default branch is cloned and the
+            # commit fetched on top of it below
+            branch_options = [f"--branch={branch}"] if branch and not is_commit else []
+            repo = git.Repo.clone_from(clone_url, cache_dir, multi_options=clone_options + branch_options)
         except git.exc.GitCommandError as e:
-            print(f"Warning: Could not checkout {branch}: {e}")
+            if not branch or is_commit:
+                raise
+            print(f"Warning: Could not clone branch {branch}: {e}")
             print("Continuing with default branch...")
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            repo = git.Repo.clone_from(clone_url, cache_dir, multi_options=clone_options)
+            branch_options = []
+        if is_commit:
+            try:
+                # Servers only accept full hashes here; abbreviated ones end up in the warning
+                repo.git.fetch("--depth=1", "origin", branch)
+                repo.git.reset("--soft", "FETCH_HEAD")
+                print(f"Checked out commit: {branch}")
+            except git.exc.GitCommandError as e:
+                print(f"Warning: Could not check out {branch}: {e}")
+                print("Continuing with default branch...")
+        elif branch_options:
+            print(f"Checked out branch: {branch}")
+        if subdirectory:
+            repo.git.sparse_checkout("set", "--cone", subdirectory)
+            repo.git.checkout()
     
-    # Extract commit information
+    # Extract commit information (one git call instead of loading the commit object)
     try:
-        current_commit = repo.head.commit
-        commit_hash = current_commit.hexsha
-        commit_short_hash = current_commit.hexsha[:7]
-        commit_message = current_commit.message.strip()
-        commit_author = str(current_commit.author)
-        commit_date = current_commit.committed_datetime.isoformat()
+        commit_hash, commit_author, commit_date, commit_message = repo.git.log(
+            "-1", "--format=%H%n%an%n%cI%n%B"
+        ).split("\n", 3)
+        commit_short_hash = commit_hash[:7]
+        commit_message = commit_message.strip()
         print(f"Repository at commit: {commit_short_hash} - {commit_message[:50]}...")
     except Exception as e:
         print(f"Warning: Could not extract commit information: {e}")
@@ -156,61 +237,88 @@ def crawl_git_repo(
         commit_author = "unknown"
         commit_date = "unknown"
 
-    # Determine the directory to crawl
-    crawl_dir = cache_dir
+    # Determine the tree to crawl
+    subtree = []
     if subdirectory:
-        subdirectory_path = os.path.join(cache_dir, subdirectory)
-        if os.path.exists(subdirectory_path):
-            crawl_dir = subdirectory_path
+        subdirectory_path = subdirectory.strip("/")
+        if repo.git.ls_tree("-d", "HEAD", "--", subdirectory_path):
+            subtree = [subdirectory_path]
             print(f"Crawling subdirectory: {subdirectory}")
         else:
             print(f"Warning: Subdirectory '{subdirectory}' not found, crawling entire repository")
+            if repo.git.config("--bool", "core.sparseCheckout", with_exceptions=False) == "true":
+                repo.git.sparse_checkout("disable")  # Check out the rest of the tree
 
-    # Walk through the directory and collect files
+    # List the tracked files of the commit with their blob sizes; limited to the
+    # subdirectory when crawling one
     try:
-        for root, dirs, filenames in os.walk(crawl_dir):
-            # Skip .git directory
-            if '.git' in dirs:
-                dirs.remove('.git')
-            
-            for filename in filenames:
-                abs_path = os.path.join(root, filename)
-                
-                # Calculate relative path
-                if use_relative_paths and subdirectory:
-                    # Relative to subdirectory
-                    rel_path = os.path.relpath(abs_path, crawl_dir)
-                else:
-                    # Relative to repository root
-                    rel_path = os.path.relpath(abs_path, cache_dir)
-                    if subdirectory and rel_path.startswith(subdirectory):
-                        # If we're in a subdirectory but not using relative paths,
-                        # keep the subdirectory in the path
-                        pass
-
-                # Check file size
-                try:
-                    file_size = os.path.getsize(abs_path)
-                except OSError:
-                    continue
+        tree_entries = repo.git.ls_tree("-r", "-l", "-z", "HEAD", "--", *subtree).split("\0")
+        files_to_read = []  # (rel_path, object_id, extension, file_size) of files that passed the filters
 
-                if file_size > max_file_size:
-                    skipped_files.append((rel_path, file_size))
-                    print(f"Skipping {rel_path}: size {file_size} exceeds limit {max_file_size}")
-                    continue
+        for tree_entry in tree_entries:
+            # "<mode> <type> <object> <size>\t<path>"; submodules are "commit" entries, and
+            # symlinks (mode 120000) are blobs holding only the link target
+            entry_info, _, repo_path = tree_entry.partition("\t")
+            if not repo_path:
+                continue
+            mode, object_type, object_id, file_size = entry_info.split()
+            if object_type != "blob" or mode == "120000":
+                continue
 
-                # Check include/exclude patterns
-                if not should_include_file(rel_path, filename):
-                    continue
+            filename = repo_path.rpartition("/")[2]
+            if use_relative_paths and subtree:
+                # Relative to subdirectory
+                rel_path = repo_path.removeprefix(subtree[0] + "/")
+            else:
+                # Relative to repository root (keeps the subdirectory in the path)
+                rel_path = repo_path
+
+            # Check include/exclude patterns
+            if filter_active and not should_include_file(rel_path, filename):
+                continue
+
+            extension = os.path.splitext(filename)[1].lower()
+            if extension in BINARY_EXTENSIONS:
+                if verbose:
+                    print(f"Skipping {rel_path}: binary file")
+                continue
+
+            # Check file size
+            file_size = int(file_size)
+            if file_size > max_file_size:
+                skipped_files.append((rel_path, file_size))
+                print(f"Skipping {rel_path}: size {file_size} exceeds limit {max_file_size}")
+                continue
+
+            files_to_read.append((rel_path, object_id, extension, file_size))
 
-                # Read file content
-                try:
-                    with open(abs_path, "r", encoding="utf-8-sig") as f:
-                        content = f.read()
-                    files[rel_path] = content
+        # Read the selected blobs straight from the object database, split into contiguous
+        # shards read concurrently, then record them in tree order
+        workers = max(1, min(BLOB_READ_WORKERS, len(files_to_read) // MIN_BLOBS_PER_WORKER))
+        shard_size = max(1, -(-len(files_to_read) // workers))  # 1 keeps range() valid when nothing passed
+        object_ids = [object_id for _, object_id, _, _ in files_to_read]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            shards = executor.map(
+                lambda start: _read_blobs(cache_dir, object_ids[start : start + shard_size]),
+                range(0, len(object_ids), shard_size),
+            )
+            read_results = [result for shard in shards for result in shard]
+
+        for (rel_path, _, extension, file_size), (data, error) in zip(files_to_read, read_results):
+            try:
+                if error is not None:
+                    raise error
+                if not extension and data.startswith(BINARY_SIGNATURES):
+                    if verbose:
+                        print(f"Skipping {rel_path}: binary file")
+                    continue
+                files[rel_path] = _decode_text(data)
+                if verbose:
                     print(f"Added {rel_path} ({file_size} bytes)")
-                except Exception as e:
-                    print(f"Failed to read {rel_path}: {e}")
+            except Exception as e:
+                print(f"Failed to read {rel_path}: {e}")
+
+        print(f"Added {len(files)} files, skipped {len(skipped_files)} over the size limit")
     
     except git.exc.GitCommandError as e:
         error_msg = f"Failed to clone repository: {e}"
@@ -332,11 +440,10 @@ if __name__ == "__main__":
         "git@github.com:microsoft/autogen.git"
     ]
     
-    for url in test_urls:
-        print(f"\n--- Testing URL: {url} ---")
+    def crawl_url(url):
         # Parse GitHub URL to extract components
         clean_repo_url, branch, subdirectory = parse_github_url(url)
-        result = crawl_git_repo(
+        return crawl_git_repo(
             repo_url=clean_repo_url,
             token=github_token,
             include_patterns={"*.py", "*.md"},
@@ -344,7 +451,14 @@ if __name__ == "__main__":
             branch=branch,
             subdirectory=subdirectory
         )
-        
+
+    # Clones are network bound and go to separate cache directories, so run them concurrently
+    max_workers = int(os.environ.get("CRAWL_WORKERS", "8"))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(crawl_url, test_urls))
+
+    for url, result in zip(test_urls, results):
+        print(f"\n--- Testing URL: {url} ---")
         print(f"Files found: {result['stats']['downloaded_count']}")
         print(f"Files skipped: {result['stats']['skipped_count']}")
         if result.get('files'):
@@ -1,7 +1,59 @@
 import os
-import fnmatch
+import codecs
+import mmap
 import pathspec
 import git
+from concurrent.futures import ThreadPoolExecutor
+from utils.file_filters import BINARY_EXTENSIONS, BINARY_SIGNATURES, pattern_matcher
+
+# Reads are I/O bound, so more threads than cores still pay off
+MAX_READ_WORKERS = 32
+
+# Directory listings run concurrently; the kernel serves them in parallel
+SCAN_WORKERS = min(8, os.cpu_count() or 1)
+
+# Files at least this large are decoded straight from a memory map, skipping the
+# intermediate bytes copy of the whole file
+MMAP_THRESHOLD = 64 * 1024
+
+# Roughly how many progress lines a crawl prints; files skipped for their size
+# or a read error are always reported
+PROGRESS_LINES = 200
+
+
+def _read_file(filepath, size):
+    """
+    Returns (content, error) so one unreadable file doesn't stop the crawl.
+    size is the file's size from the crawl's stat, so the file isn't stat-ed again.
+    """
+    try:
+        # Decoded in one go rather than through a text-mode (utf-8-sig) stream; the
+        # BOM and newline handling match what that stream did
+        with open(filepath, "rb") as f:
+            if size >= MMAP_THRESHOLD:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    bom = len(codecs.BOM_UTF8) if view[:3] == codecs.BOM_UTF8 else 0
+                    with view[bom:] as text:
+                        content = str(text, "utf-8")
+            else:
+                content = f.read().removeprefix(codecs.BOM_UTF8).decode("utf-8")
+        if "\r" in content:
+            content = content.replace("\r\n", "\n").replace("\r", "\n")
+        return content, None
+    except Exception as e:
+        return None, e
+
+
+def _is_binary_file(filepath):
+    """Known binary extension or, for files without an extension, a binary signature."""
+    extension = os.path.splitext(filepath)[1].lower()
+    if extension:
+        return extension in BINARY_EXTENSIONS
+    try:
+        with open(filepath, "rb") as f:
+            return f.read(8).startswith(BINARY_SIGNATURES)
+    except OSError:
+        return False
 
 
 def crawl_local_files(
@@ -27,6 +79,13 @@ def crawl_local_files(
         raise ValueError(f"Directory does not exist: {directory}")
 
     files_dict = {}
+    matches_include = pattern_matcher(include_patterns)
+    matches_exclude = pattern_matcher(exclude_patterns)
+    # A pattern ending in "*" that matches "<dir>/" matches everything below <dir>
+    # (e.g. "node_modules/*", "*venv/*"), so such directories are not walked at all
+    matches_excluded_tree = pattern_matcher(
+        {pattern for pattern in exclude_patterns or () if pattern.endswith("*")}
+    )
 
     # --- Load .gitignore ---
     gitignore_path = os.path.join(directory, ".gitignore")
@@ -40,92 +99,134 @@ def crawl_local_files(
         except Exception as e:
             print(f"Warning: Could not read or parse .gitignore file {gitignore_path}: {e}")
 
-    all_files = []
-    for root, dirs, files in os.walk(directory):
-        # Filter directories using .gitignore and exclude_patterns early
-        excluded_dirs = set()
-        for d in dirs:
-            dirpath_rel = os.path.relpath(os.path.join(root, d), directory)
+    def is_excluded_dir(dir_entry, dirpath_rel):
+        """Filter directories using .gitignore and exclude_patterns before walking them"""
+        if gitignore_spec and gitignore_spec.match_file(dirpath_rel):
+            return True
+
+        if matches_exclude and (matches_exclude(dirpath_rel) or matches_exclude(dir_entry.name)):
+            return True
+        return bool(matches_excluded_tree and matches_excluded_tree(dirpath_rel + "/"))
 
-            if gitignore_spec and gitignore_spec.match_file(dirpath_rel):
-                excluded_dirs.add(d)
-                continue
+    def list_dir(path, rel_dir):
+        """
+        Returns the ([files], [subdirectories to walk]) of path as (entry, path relative
+        to directory) pairs. The DirEntry objects keep what scandir already learned, so
+        files are not stat-ed again to be classified.
+        """
+        try:
+            with os.scandir(path) as it:
+                entries = list(it)
+        except OSError:
+            return [], []  # Unreadable directory, skipped like os.walk does
+        files, subdirs = [], []
+        for entry in entries:
+            entry_rel = os.path.join(rel_dir, entry.name)
+            if entry.is_dir():
+                # Symlinked directories are not followed, as with os.walk
+                if not entry.is_symlink() and not is_excluded_dir(entry, entry_rel):
+                    subdirs.append((entry, entry_rel))
+            else:
+                files.append((entry, entry_rel))
+        return files, subdirs
+
+    # --- List the directories one tree level at a time, each level concurrently ---
+    listings = {}  # path -> list_dir(path)
+    level = [(directory, "")]
+    with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+        while level:
+            level_listings = executor.map(lambda dir_info: list_dir(*dir_info), level)
+            next_level = []
+            for (path, _), listing in zip(level, level_listings):
+                listings[path] = listing
+                next_level.extend((entry.path, entry_rel) for entry, entry_rel in listing[1])
+            level = next_level
 
-            if exclude_patterns:
-                for pattern in exclude_patterns:
-                    if fnmatch.fnmatch(dirpath_rel, pattern) or fnmatch.fnmatch(d, pattern):
-                        excluded_dirs.add(d)
-                        break
+    def walk_order(path):
+        """Yields the listed files under path in os.walk order"""
+        files, subdirs = listings[path]
+        yield from files
+        for entry, _ in subdirs:
+            yield from walk_order(entry.path)
+
+    def passes_filters(relpath):
+        """Not ignored by .gitignore or exclude_patterns, and matched by include_patterns"""
+        if gitignore_spec and gitignore_spec.match_file(relpath):
+            return False
+        if matches_exclude and matches_exclude(relpath):
+            return False
+        return matches_include(relpath) if matches_include else True
 
-        for d in dirs.copy():
-            if d in excluded_dirs:
-                dirs.remove(d)
+    # Without patterns or a .gitignore every file passes, so the check is skipped entirely
+    filter_active = bool(gitignore_spec or matches_include or matches_exclude)
 
-        for filename in files:
-            filepath = os.path.join(root, filename)
-            all_files.append(filepath)
+    all_files = list(walk_order(directory))
 
     total_files = len(all_files)
     processed_files = 0
+    progress_step = max(1, total_files // PROGRESS_LINES)
 
-    for filepath in all_files:
-        relpath = os.path.relpath(filepath, directory) if use_relative_paths else filepath
+    def print_progress(file_number, relpath, status):
+        routine = status in ("processed", "skipped (excluded)", "skipped (binary)")
+        if routine and file_number % progress_step and file_number != total_files:
+            return
+        percentage = int(file_number / total_files * 100)
+        print(f"\033[92mProgress: {file_number}/{total_files} ({percentage}%) {relpath} [{status}]\033[0m")
 
-        # --- Exclusion check ---
-        excluded = False
-        if gitignore_spec and gitignore_spec.match_file(relpath):
-            excluded = True
-
-        if not excluded and exclude_patterns:
-            for pattern in exclude_patterns:
-                if fnmatch.fnmatch(relpath, pattern):
-                    excluded = True
-                    break
-
-        included = False
-        if include_patterns:
-            for pattern in include_patterns:
-                if fnmatch.fnmatch(relpath, pattern):
-                    included = True
-                    break
-        else:
-            included = True
+    files_to_read = []  # (progress count, filepath, relpath, size) of files that passed the filters
+
+    for file_entry, file_rel in all_files:
+        filepath = file_entry.path
+        relpath = file_rel if use_relative_paths else filepath
 
         processed_files += 1 # Increment processed count regardless of inclusion/exclusion
 
         status = "processed"
-        if not included or excluded:
+        # --- Inclusion/exclusion check ---
+        if filter_active and not passes_filters(relpath):
             status = "skipped (excluded)"
             # Print progress for skipped files due to exclusion
-            if total_files > 0:
-                percentage = (processed_files / total_files) * 100
-                rounded_percentage = int(percentage)
-                print(f"\033[92mProgress: {processed_files}/{total_files} ({rounded_percentage}%) {relpath} [{status}]\033[0m")
+            print_progress(processed_files, relpath, status)
             continue # Skip to next file if not included or excluded
 
-        if max_file_size and os.path.getsize(filepath) > max_file_size:
+        if _is_binary_file(filepath):
+            print_progress(processed_files, relpath, "skipped (binary)")
+            continue # Skip binary files without reading them
+
+        # Cached on the DirEntry; also passed to the reader
+        try:
+            file_size = file_entry.stat().st_size
+        except OSError as e:
+            print(f"Warning: Could not read file {filepath}: {e}")
+            print_progress(processed_files, relpath, "skipped (read error)")
+            continue
+
+        if max_file_size and file_size > max_file_size:
             status = "skipped (size limit)"
             # Print progress for skipped files due to size limit
-            if total_files > 0:
-                percentage = (processed_files / total_files) * 100
-                rounded_percentage = int(percentage)
-                print(f"\033[92mProgress: {processed_files}/{total_files} ({rounded_percentage}%) {relpath} [{status}]\033[0m")
+            print_progress(processed_files, relpath, status)
             continue # Skip large files
 
-        # --- File is being processed ---        
-        try:
-            with open(filepath, "r", encoding="utf-8-sig") as f:
-                content = f.read()
-            files_dict[relpath] = content
-        except Exception as e:
-            print(f"Warning: Could not read file {filepath}: {e}")
-            status = "skipped (read error)"
+        files_to_read.append((processed_files, filepath, relpath, file_size))
+
+    # --- Read the selected files concurrently, then record them in walk order ---
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_READ_WORKERS, len(files_to_read)))) as executor:
+        read_results = executor.map(
+            _read_file,
+            [filepath for _, filepath, _, _ in files_to_read],
+            [size for _, _, _, size in files_to_read],
+        )
+
+        for (file_number, filepath, relpath, _), (content, error) in zip(files_to_read, read_results):
+            status = "processed"
+            if error is None:
+                files_dict[relpath] = content
+            else:
+                print(f"Warning: Could not read file {filepath}: {error}")
+                status = "skipped (read error)"
 
-        # --- Print progress for processed or error files ---
-        if total_files > 0:
-            percentage = (processed_files / total_files) * 100
-            rounded_percentage = int(percentage)
-            print(f"\033[92mProgress: {processed_files}/{total_files} ({rounded_percentage}%) {relpath} [{status}]\033[0m")
+            # --- Print progress for processed or error files ---
+            print_progress(file_number, relpath, status)
 
     # Try to extract git information if directory is a git repository
     git_info = {
@@ -0,0 +1,28 @@
+import os
+import re
+import fnmatch
+from functools import lru_cache
+
+# Files with these extensions are binary, so they are skipped without being read
+BINARY_EXTENSIONS = frozenset((
+    ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".ico", ".webp", ".pdf",
+    ".zip", ".tar", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".whl", ".jar", ".class",
+    ".so", ".dylib", ".dll", ".exe", ".o", ".a", ".pyc", ".pyo",
+    ".woff", ".woff2", ".ttf", ".otf", ".mp3", ".mp4", ".wav", ".sqlite", ".db",
+))
+# Leading bytes of common binary formats, checked for files without an extension
+BINARY_SIGNATURES = (b"PK\x03\x04", b"\x89PNG", b"%PDF", b"\x7fELF", b"GIF8", b"\xff\xd8\xff", b"\x1f\x8b", b"\xca\xfe\xba\xbe")
+
+
+@lru_cache(maxsize=None)
+def _compile_patterns(patterns: frozenset):
+    """One regex for a set of glob patterns, with fnmatch.fnmatch semantics."""
+    return re.compile("|".join(fnmatch.translate(os.path.normcase(p)) for p in sorted(patterns)))
+
+
+def pattern_matcher(patterns):
+    """matches(path) -> bool checking all patterns in one regex match, or None without patterns."""
+    if not patterns:
+        return None
+    regex = _compile_patterns(frozenset(patterns))
+    return lambda path: regex.match(os.path.normcase(path)) is not None
@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+from contextlib import closing
+try:
+    import orjson  # Optional: faster (de)serialization of large cached tutorials
+except ImportError:
+    orjson = None
+
+# Bump when prompts or the cached fields change, so old tutorials are not reused
+TUTORIAL_CACHE_VERSION = 9
+
+# Same database as the LLM response cache (utils/call_llm.py), in a table of its own.
+# One row per tutorial, so a lookup or save doesn't read or rewrite the others
+CACHE_FILE = "llm_cache.sqlite"
+# Only the most recently saved tutorials are kept
+MAX_CACHED_TUTORIALS = 50
+
+# Generated results stored per tutorial, restored into the shared store on a hit
+CACHED_FIELDS = (
+    "repository_type",
+    "abstractions",
+    "relationships",
+    "chapter_order",
+    "chapters",
+    "beginner_friendly_episode",
+    "index_content",
+)
+
+
+def tutorial_cache_key(shared):
+    """Key on the fetched files plus every setting that changes the generated tutorial."""
+    settings = {
+        "version": TUTORIAL_CACHE_VERSION,
+        "repo_fingerprint": shared.get("repo_fingerprint"),
+        "project_name": shared.get("project_name"),
+        "language": shared.get("language", "english").lower(),
+        "max_abstraction_num": shared.get("max_abstraction_num"),
+        "condense_files": bool(shared.get("condense_files")),
+        "single_pass": bool(shared.get("single_pass")),
+        "llm_context_budget": shared.get("llm_context_budget"),
+        "model": os.getenv("OPENAI_MODEL", "gemini-2.0-flash-exp"),
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _connect(cache_file):
+    db = sqlite3.connect(cache_file)
+    db.execute("PRAGMA journal_mode=WAL")  # Other processes can read while one writes
+    db.execute(
+        "CREATE TABLE IF NOT EXISTS tutorials "
+        "(key TEXT PRIMARY KEY, fields TEXT NOT NULL, saved_at REAL NOT NULL)"
+    )
+    return db
+
+
+def load_cached_tutorial(key, cache_file=CACHE_FILE):
+    """Returns the cached fields for key, or None."""
+    try:
+        with closing(_connect(cache_file)) as db:
+            row = db.execute("SELECT fields FROM tutorials WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        return orjson.loads(row[0]) if orjson is not None else json.loads(row[0])
+    except Exception as e:
+        print(f"Warning: Failed to load tutorial cache, ignoring it: {e}")
+        return None
+
+
+def save_cached_tutorial(key, shared, cache_file=CACHE_FILE):
+    fields = {field: shared.get(field) for field in CACHED_FIELDS}
+    try:
+        if orjson is not None:
+            encoded = orjson.dumps(fields, option=orjson.OPT_NON_STR_KEYS).decode("utf-8")
+        else:
+            encoded = json.dumps(fields, ensure_ascii=False, separators=(",", ":"))
+        # One transaction, so an interrupted save leaves the previous entries intact
+        with closing(_connect(cache_file)) as db, db:
+            db.execute(
+                "INSERT OR REPLACE INTO tutorials VALUES (?, ?, ?)", (key, encoded, time.time())
+            )
+            db.execute(
+                "DELETE FROM tutorials WHERE key NOT IN "
+                "(SELECT key FROM tutorials ORDER BY saved_at DESC LIMIT ?)",
+                (MAX_CACHED_TUTORIALS,),
+            )
+    except Exception as e:
+        print(f"Warning: Failed to save tutorial cache: {e}")